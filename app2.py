@@ -1,6 +1,8 @@
+import html
 import streamlit as st
 from backend_model import *
 from PIL import Image
+from ingest import count_pages, is_pdf, iter_pages
 
 # Enhanced Dark Theme with Vibrant Colors
 st.markdown("""
@@ -186,9 +188,14 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
-# Initialize database and model
-init_db()
-model, tokenizer, device = load_model()
+# Initialize database and model once per process; Streamlit reruns this script on every interaction
+@st.cache_resource
+def init_db_once():
+    init_db()
+
+
+init_db_once()
+model, tokenizer, device = get_model()
 
 # Header section with enhanced design
 st.markdown("""
@@ -207,7 +214,7 @@ st.markdown("""
         <span style="margin-right: 10px;">📌</span> How to Use
     </h3>
     <ol style="margin: 10px 0 0 20px; padding: 0; color: #f0f2f6; line-height: 1.6;">
-        <li style="margin-bottom: 8px;">Paste contract text <strong style="color: #9d50bb;">OR</strong> Upload image of contract (PNG/JPG)</li>
+        <li style="margin-bottom: 8px;">Paste contract text <strong style="color: #9d50bb;">OR</strong> Upload image of contract (PNG/JPG), multi-page TIFF or PDF</li>
         <li style="margin-bottom: 8px;">The system will automatically process the content</li>
         <li style="margin-bottom: 8px;">Click <span style="color: #4776E6; font-weight: bold;">Analyze Contract</span> button</li>
         <li style="margin-bottom: 8px;">View detailed risk analysis with <span style="color: #2ecc71;">legal references</span></li>
@@ -233,25 +240,46 @@ if input_method == "Text Input":
     )
 else:
     uploaded_file = st.file_uploader(
-        "📤 Upload Contract Image",
-        type=["png", "jpg", "jpeg"],
-        help="Upload a clear image of your contract document for text extraction"
+        "📤 Upload Contract Image or Document",
+        type=["png", "jpg", "jpeg", "tif", "tiff", "pdf"],
+        help="Upload a clear image of your contract, a multi-page TIFF scan or a PDF for text extraction"
     )
     if uploaded_file:
-        image = Image.open(uploaded_file)
-        st.image(image, caption="Uploaded Contract", use_container_width=True, output_format="PNG",
-                 width=300, clamp=True)
-        contract_text = extract_text_from_image(image)
+        if not is_pdf(uploaded_file):
+            image = Image.open(uploaded_file)
+            st.image(image, caption="Uploaded Contract", use_container_width=True, output_format="PNG",
+                     width=300, clamp=True)
+            uploaded_file.seek(0)
+
+        # Pages are extracted one at a time so long scans never sit in memory all at once. The text is
+        # kept for the current upload only, so reruns (Analyze, history filters) don't OCR it again
+        extracted = st.session_state.get('extracted_text')
+        if extracted is None or extracted[0] != uploaded_file.file_id:
+            page_count = count_pages(uploaded_file)
+            progress = st.progress(0.0, text=f"Extracting text from {page_count} page(s)...")
+            page_texts = []
+            for page_number, page_text in iter_pages(uploaded_file):
+                page_texts.append(page_text)
+                progress.progress(page_number / page_count, text=f"Extracted page {page_number} of {page_count}")
+            progress.empty()
+            extracted = st.session_state.extracted_text = (uploaded_file.file_id, PAGE_SEPARATOR.join(page_texts))
+
         contract_text = st.text_area(
             "✍️ Extracted Text (edit if needed):",
-            value=contract_text,
+            value=extracted[1],
             height=300
         )
 
 if st.button("🚀 Analyze Contract", type="primary", key="analyze_btn") and contract_text:
     with st.spinner("🔍 Analyzing contract... This may take a moment"):
-        analysis = analyze_contract(contract_text, model, tokenizer, device)
-        save_to_db(analysis)
+        # One session per browser tab: same result as analyze_contract(chunked=True, use_cache=True), but after an
+        # edit only the changed clauses are re-scanned and only the changed windows re-run. Reloaded model weights
+        # invalidate the logits it kept.
+        if st.session_state.get('analysis_session') is None or st.session_state.analysis_session.model is not model:
+            st.session_state.analysis_session = AnalysisSession(model, tokenizer, device, short_circuit=True,
+                                                                use_cache=True)
+        analysis = st.session_state.analysis_session.analyze(contract_text, timings=True)
+        save_to_db_async(analysis)
 
         st.success("✅ Analysis Complete!")
         st.balloons()
@@ -308,6 +336,20 @@ if st.button("🚀 Analyze Contract", type="primary", key="analyze_btn") and con
             </div>
             """, unsafe_allow_html=True)
 
+        # Passage of a long contract that drove a Risky verdict
+        risky_window = analysis.get('windows', {}).get('risky_window')
+        if risky_window:
+            st.markdown(f"""
+            <div style="margin: 20px 0; padding: 15px; background: rgba(231, 76, 60, 0.1); 
+                        border-radius: 8px; border-left: 4px solid #e74c3c;">
+                <h4 style="margin: 0 0 5px 0; color: #f0f2f6;">
+                    ⚠️ Riskiest Passage (part {risky_window['index'] + 1} of {analysis['windows']['count']})</h4>
+                <p style="margin: 0; color: rgba(240,242,246,0.7); font-size: 0.9em;">
+                    {html.escape(risky_window['excerpt'])}...
+                </p>
+            </div>
+            """, unsafe_allow_html=True)
+
         # Findings in tabs with better organization
         tab1, tab2, tab3, tab4 = st.tabs(["🔍 Ambiguities", "⚠️ Red Flags", "📊 Language Analysis", "🔎 Missing Sections"])
 
@@ -535,21 +577,101 @@ if st.button("🚀 Analyze Contract", type="primary", key="analyze_btn") and con
             </div>
             """, unsafe_allow_html=True)
 
+        # Where the time went, for diagnosing slow analyses
+        timings = analysis.get('timings', {})
+        with st.expander("⏱️ Performance details"):
+            stage_cols = st.columns(5)
+            stage_cols[0].metric("Total", f"{timings.get('total_ms', 0):.1f} ms")
+            stage_cols[1].metric("Model tokens", timings.get('tokens', 0))
+            stage_cols[2].metric("Result cache", analysis.get('cache', 'off'))
+            incremental = analysis.get('incremental', {})
+            stage_cols[3].metric("Reused segments", f"{incremental.get('reused', 0)}/{incremental.get('segments', 0)}")
+            stage_cols[4].metric("Inference path", analysis.get('inference_path', 'model').replace('_', ' '))
+            stages = {key[:-3]: value for key, value in timings.items() if key.endswith('_ms') and key != 'total_ms'}
+            st.table({'Stage': list(stages), 'Time (ms)': [f"{value:.2f}" for value in stages.values()]})
+
+
+# Clause-by-clause review, streamed as each batch of clauses is scored
+if st.button("🧩 Review Clause by Clause", key="clauses_btn") and contract_text:
+    st.markdown("""
+    <div style="background: linear-gradient(135deg, #1a1d2c, #2c3e50); color: #6e48aa; 
+                padding: 15px 20px; border-radius: 12px; margin: 25px 0; 
+                border: 1px solid rgba(110, 72, 170, 0.3); box-shadow: 0 8px 16px rgba(0,0,0,0.3);">
+        <h2 style="color: white; margin: 0; display: flex; align-items: center;">
+            <span style="margin-right: 10px;">🧩</span> Clause Review
+        </h2>
+    </div>
+    """, unsafe_allow_html=True)
+
+    status = st.empty()
+    reviewed = flagged = 0
+    for clause in iter_clause_analyses(contract_text, model, tokenizer, device):
+        reviewed += 1
+        findings = list(clause['ambiguities']) + list(clause['fake_indicators'])
+        if clause['clause_class'] == 0 or findings:
+            flagged += 1
+            color = '#e74c3c' if clause['clause_class'] == 0 else '#f39c12'
+            label = clause['number'] or f"#{clause['index'] + 1}"
+            section = f" · Section {clause['section']}" if clause['section'] else ""
+            st.markdown(f"""
+            <div style="margin: 10px 0; padding: 12px 15px; background: rgba(255,255,255,0.03); 
+                        border-radius: 8px; border-left: 4px solid {color};">
+                <div style="display: flex; justify-content: space-between;">
+                    <h4 style="margin: 0; color: #f0f2f6;">Clause {html.escape(label)}{html.escape(section)}</h4>
+                    <span style="color: {color}; font-weight: bold;">
+                        {'⚠️ Risky' if clause['clause_class'] == 0 else '🔍 Review'} · {clause['risk_score']:.0f} pts</span>
+                </div>
+                <p style="margin: 5px 0; color: rgba(240,242,246,0.6); font-size: 0.8em;">
+                    Characters {clause['start']}–{clause['end']}
+                    {' · ' + html.escape(', '.join(findings)) if findings else ''}</p>
+                <p style="margin: 0; color: rgba(240,242,246,0.8); font-size: 0.9em;">
+                    {html.escape(clause['text'][:400])}{'...' if len(clause['text']) > 400 else ''}</p>
+            </div>
+            """, unsafe_allow_html=True)
+        status.info(f"🔍 Reviewed {reviewed} clause(s), {flagged} flagged so far...")
+    status.success(f"✅ Reviewed {reviewed} clause(s), {flagged} flagged")
+
 
 # History section with better design
 if st.button("📁 View Analysis History", key="history_btn"):
-    history = get_previous_analyses()
-    if not history.empty:
-        st.markdown("""
-        <div style="background: linear-gradient(135deg, #1a1d2c, #2c3e50); color: #6e48aa; 
-                    padding: 15px 20px; border-radius: 12px; margin: 25px 0; 
-                    border: 1px solid rgba(110, 72, 170, 0.3); box-shadow: 0 8px 16px rgba(0,0,0,0.3);">
-            <h2 style="color: white; margin: 0; display: flex; align-items: center;">
-                <span style="margin-right: 10px;">⏳</span> Previous Analyses
-            </h2>
-        </div>
-        """, unsafe_allow_html=True)
+    st.session_state.show_history = True
+
+if st.session_state.get('show_history'):
+    st.markdown("""
+    <div style="background: linear-gradient(135deg, #1a1d2c, #2c3e50); color: #6e48aa; 
+                padding: 15px 20px; border-radius: 12px; margin: 25px 0; 
+                border: 1px solid rgba(110, 72, 170, 0.3); box-shadow: 0 8px 16px rgba(0,0,0,0.3);">
+        <h2 style="color: white; margin: 0; display: flex; align-items: center;">
+            <span style="margin-right: 10px;">⏳</span> Previous Analyses
+        </h2>
+    </div>
+    """, unsafe_allow_html=True)
+
+    with st.expander("🔎 Filter history"):
+        filter_col1, filter_col2, filter_col3 = st.columns(3)
+        with filter_col1:
+            risk_range = st.slider("Risk score", 0, 100, (0, 100), key="history_risk")
+        with filter_col2:
+            strengths = st.multiselect("Strength", ["Strong", "Moderate", "Weak"], key="history_strength")
+        with filter_col3:
+            date_range = st.date_input("Date range", value=(), key="history_dates")
+
+    history_filters = {
+        'min_risk': risk_range[0] if risk_range[0] > 0 else None,
+        'max_risk': risk_range[1] if risk_range[1] < 100 else None,
+        'strength': strengths or None,
+        'start_date': date_range[0] if len(date_range) > 0 else None,
+        'end_date': date_range[1] if len(date_range) > 1 else None
+    }
+
+    # Cursors of the pages seen so far; changing a filter starts again from the newest page
+    if st.session_state.get('history_filters') != history_filters:
+        st.session_state.history_filters = history_filters
+        st.session_state.history_cursors = [None]
+    history_cursors = st.session_state.history_cursors
 
+    history, next_cursor = get_analyses_page(limit=10, cursor=history_cursors[-1], **history_filters)
+    if not history.empty:
         # Enhanced dataframe display
         st.dataframe(
             history,
@@ -571,5 +693,19 @@ if st.button("📁 View Analysis History", key="history_btn"):
             use_container_width=True,
             hide_index=True
         )
+    else:
+        st.info("No analyses match these filters")
+
+    page_col1, page_col2, page_col3 = st.columns([1, 2, 1])
+    with page_col1:
+        if st.button("⬅️ Newer", key="history_newer", disabled=len(history_cursors) == 1):
+            history_cursors.pop()
+            st.rerun()
+    with page_col2:
+        st.markdown(f"<p style='text-align: center;'>Page {len(history_cursors)}</p>", unsafe_allow_html=True)
+    with page_col3:
+        if st.button("Older ➡️", key="history_older", disabled=next_cursor is None):
+            history_cursors.append(next_cursor)
+            st.rerun()
 
 
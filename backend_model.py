@@ -1,12 +1,20 @@
-import re
-import sqlite3
-import torch
+import ast
+import contextlib
+import hashlib
+import io
+import json
+import math
+import os
+import threading
+import time
 import pickle
-import pytesseract
-import pandas as pd
-from PIL import Image
-from transformers import GPT2ForSequenceClassification, GPT2Tokenizer
-from datetime import datetime
+from datetime import date, datetime, timedelta
+from metrics import ANALYSES, CACHE_LOOKUPS, ROWS_WRITTEN, collect_timings, count_tokens, stage
+from result_cache import ResultCache, file_fingerprint, text_hash
+from rule_engine import RuleEngine
+from segmentation import iter_clauses
+from tokenization import batch_tensors, encodings
+from storage import WriteBehindQueue, document_hash, get_pool, load_document, migrate, store_documents
 
 # Research references database
 RESEARCH_REFERENCES = {
@@ -60,90 +68,555 @@ RESEARCH_REFERENCES = {
     }
 }
 
+# Rule terms whose pattern is not the literal term
+RULE_PATTERNS = {
+    'reasonable efforts': r'reasonable efforts?',
+    'non-binding': r'non-?binding'
+}
+
+MODAL_WEIGHTS = {'shall': 0.2, 'must': 0.1, 'may': 0.5, 'should': 0.4}
+
+RULE_ENGINE = RuleEngine(
+    {category: RESEARCH_REFERENCES[category]['terms']
+     for category in ('ambiguous_terms', 'fake_indicators', 'modals', 'missing_sections')},
+    RULE_PATTERNS
+)
+
+
+def scan_rules(text):
+    """Offsets of every rule term in text, by category and term"""
+    return RULE_ENGINE.scan(text.lower())
+
+
+DB_PATH = "legal_contracts.db"
+
+INSERT_FINDING_SQL = "INSERT INTO findings (analysis_id, category, term, count) VALUES (?, ?, ?, ?)"
+
+
+def _move_texts_to_documents(conn, batch_size=1000):
+    """Migration step: replace inline contract_text with references into the documents table"""
+    last_id = 0
+    while True:
+        rows = conn.execute(
+            "SELECT id, contract_text FROM analyses WHERE id > ? AND contract_text IS NOT NULL ORDER BY id LIMIT ?",
+            (last_id, batch_size)
+        ).fetchall()
+        if not rows:
+            return
+        hashes = [document_hash(text) for _, text in rows]
+        store_documents(conn, {h: text for h, (_, text) in zip(hashes, rows)})
+        conn.executemany("UPDATE analyses SET document_hash = ?, contract_text = NULL WHERE id = ?",
+                         [(h, row_id) for h, (row_id, _) in zip(hashes, rows)])
+        last_id = rows[-1][0]
+
+
+FINDING_CATEGORIES = ('ambiguities', 'fake_indicators', 'modals', 'missing_sections')
+
+
+def _finding_rows(analysis_id, findings):
+    """findings table rows for one analysis, given its four finding columns by category"""
+    rows = []
+    for category in FINDING_CATEGORIES:
+        if category == 'missing_sections':
+            rows += [(analysis_id, category, item['section'], 1) for item in findings[category]]
+        else:
+            rows += [(analysis_id, category, term, data['count']) for term, data in findings[category].items()]
+    return rows
+
+
+def _convert_findings_to_json(conn, batch_size=1000):
+    """Migration step: rewrite str(dict) finding columns as JSON and fill the findings table"""
+    last_id = 0
+    while True:
+        rows = conn.execute(
+            f"SELECT id, {', '.join(FINDING_CATEGORIES)} FROM analyses WHERE id > ? ORDER BY id LIMIT ?",
+            (last_id, batch_size)
+        ).fetchall()
+        if not rows:
+            return
+        updates, findings = [], []
+        for row_id, *columns in rows:
+            try:
+                parsed = dict(zip(FINDING_CATEGORIES, (ast.literal_eval(value) for value in columns)))
+            except (ValueError, SyntaxError, TypeError):
+                # Left as is: not something save_to_db ever wrote
+                continue
+            updates.append(tuple(json.dumps(parsed[category]) for category in FINDING_CATEGORIES) + (row_id,))
+            findings += _finding_rows(row_id, parsed)
+        conn.executemany(
+            f"UPDATE analyses SET {', '.join(c + ' = ?' for c in FINDING_CATEGORIES)} WHERE id = ?", updates)
+        conn.executemany(INSERT_FINDING_SQL, findings)
+        last_id = rows[-1][0]
+
+
+# Schema changes on top of the original analyses table, applied in order by init_db()
+MIGRATIONS = [
+    [
+        "ALTER TABLE analyses ADD COLUMN text_length INTEGER",
+        "UPDATE analyses SET text_length = length(contract_text)",
+        "CREATE INDEX IF NOT EXISTS idx_analyses_timestamp ON analyses(timestamp)",
+        "CREATE INDEX IF NOT EXISTS idx_analyses_strength ON analyses(strength, timestamp)",
+        "CREATE INDEX IF NOT EXISTS idx_analyses_classification ON analyses(classification, timestamp)",
+    ],
+    [
+        """
+        CREATE TABLE IF NOT EXISTS documents (
+            hash TEXT PRIMARY KEY,
+            codec TEXT NOT NULL,
+            body BLOB NOT NULL,
+            text_length INTEGER NOT NULL
+        )
+        """,
+        "ALTER TABLE analyses ADD COLUMN document_hash TEXT",
+        "CREATE INDEX IF NOT EXISTS idx_analyses_document ON analyses(document_hash)",
+        _move_texts_to_documents,
+    ],
+    [
+        """
+        CREATE TABLE IF NOT EXISTS findings (
+            analysis_id INTEGER NOT NULL REFERENCES analyses(id),
+            category TEXT NOT NULL,
+            term TEXT NOT NULL,
+            count INTEGER NOT NULL
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_findings_term ON findings(term, category, analysis_id)",
+        "CREATE INDEX IF NOT EXISTS idx_findings_analysis ON findings(analysis_id)",
+        _convert_findings_to_json,
+    ],
+    [
+        # batch_analyze.py's hash of the input file, so --resume can skip scans already OCRed and saved
+        "ALTER TABLE analyses ADD COLUMN source_hash TEXT",
+        "CREATE INDEX IF NOT EXISTS idx_analyses_source ON analyses(source_hash)",
+    ],
+]
 
 
 # Initialize database
 def init_db():
-    conn = sqlite3.connect("legal_contracts.db")
-    cursor = conn.cursor()
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS analyses (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            contract_text TEXT,
-            classification TEXT,
-            risk_score REAL,
-            strength TEXT,
-            ambiguities TEXT,
-            fake_indicators TEXT,
-            modals TEXT,
-            missing_sections TEXT,
-            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
-        )
-    ''')
-    conn.commit()
-    conn.close()
+    """Create the tables and apply pending migrations; safe to call any number of times"""
+    global _db_initialized
+    with get_pool(DB_PATH).connection() as conn:
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS analyses (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                contract_text TEXT,
+                classification TEXT,
+                risk_score REAL,
+                strength TEXT,
+                ambiguities TEXT,
+                fake_indicators TEXT,
+                modals TEXT,
+                missing_sections TEXT,
+                timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        conn.commit()
+        migrate(conn, MIGRATIONS)
+    _db_initialized = True
 
 
-init_db()
+_db_lock = threading.Lock()
+_db_initialized = False
 
 
-# Save analysis to database
-def save_to_db(analysis):
-    conn = sqlite3.connect("legal_contracts.db")
-    cursor = conn.cursor()
-    cursor.execute('''
-        INSERT INTO analyses (
-            contract_text, classification, risk_score, strength,
-            ambiguities, fake_indicators, modals, missing_sections
-        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-    ''', (
-        analysis['contract_text'],
+def _ensure_db():
+    """Run init_db() once per process, before the first read or write"""
+    if not _db_initialized:
+        with _db_lock:
+            if not _db_initialized:
+                init_db()
+
+
+INSERT_ANALYSIS_SQL = '''
+    INSERT INTO analyses (
+        document_hash, text_length, classification, risk_score, strength,
+        ambiguities, fake_indicators, modals, missing_sections, source_hash
+    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+'''
+
+
+def _analysis_row(analysis, doc_hash):
+    return (
+        doc_hash,
+        len(analysis['contract_text']),
         "Risky" if analysis['clause_class'] == 0 else "Valid",
         analysis['risk_score'],
         analysis['contract_strength'],
-        str(analysis['ambiguities']),
-        str(analysis['fake_indicators']),
-        str(analysis['modals']),
-        str(analysis['missing_sections'])
-    ))
-    conn.commit()
-    conn.close()
+        json.dumps(analysis['ambiguities']),
+        json.dumps(analysis['fake_indicators']),
+        json.dumps(analysis['modals']),
+        json.dumps(analysis['missing_sections']),
+        analysis.get('source_hash')
+    )
+
+
+def _insert_analyses(conn, analyses):
+    with stage('db_write'):
+        # Each distinct contract text is stored once, compressed, in the documents table
+        hashes = [document_hash(analysis['contract_text']) for analysis in analyses]
+        store_documents(conn, {h: analysis['contract_text'] for h, analysis in zip(hashes, analyses)})
+
+        conn.executemany(INSERT_ANALYSIS_SQL, [_analysis_row(analysis, h) for analysis, h in zip(analyses, hashes)])
+        # The inserts hold the write lock until commit, so AUTOINCREMENT gave them consecutive ids ending here
+        first_id = conn.execute("SELECT last_insert_rowid()").fetchone()[0] - len(analyses) + 1
+        findings = []
+        for offset, analysis in enumerate(analyses):
+            findings += _finding_rows(first_id + offset, analysis)
+        conn.executemany(INSERT_FINDING_SQL, findings)
+    ROWS_WRITTEN.inc(len(analyses))
+
+
+# Save analysis to database
+def save_to_db(analysis):
+    _ensure_db()
+    with get_pool(DB_PATH).connection() as conn:
+        _insert_analyses(conn, [analysis])
+
+
+ANALYSIS_WRITER = WriteBehindQueue(get_pool(DB_PATH), _insert_analyses)
+
+
+def save_to_db_async(analysis):
+    """Queue an analysis for the background writer and return at once; don't modify it afterwards"""
+    _ensure_db()
+    ANALYSIS_WRITER.put(analysis)
+
+
+def flush_pending_saves(timeout=None):
+    """Block until every analysis queued with save_to_db_async() is in the database"""
+    return ANALYSIS_WRITER.flush(timeout)
+
+
+MODEL_WEIGHTS_PATH = 'gpt2_legal_model.pth'
+TOKENIZER_PATH = 'tokenizer.pkl'
+# Packaged teacher (config, fast tokenizer, safetensors), see model_package.py; preferred when present
+MODEL_PACKAGE_DIR = 'gpt2_legal_model'
+# Distilled student, see distill.py
+STUDENT_WEIGHTS_PATH = 'student_model.pth'
+MODEL_VARIANTS = ('teacher', 'student', 'cascade')
+# Why the last load_model() call failed, or None after a successful one
+MODEL_LOAD_ERROR = None
+
+RESULT_CACHE = ResultCache(DB_PATH)
+
+# Held while the model runs a forward pass or is being swapped out by a reload
+_inference_lock = threading.RLock()
+
+
+def _env_flag(name):
+    return os.environ.get(name, "").strip().lower() in ("1", "true", "yes", "on")
+
+
+def _default_variant():
+    return os.environ.get("SMARTLEX_MODEL", "").strip().lower() or "teacher"
+
+
+def _conv1d_to_linear(model):
+    """Swap GPT-2's Conv1D projections for equivalent nn.Linear layers.
+
+    GPT-2 implements its attention and MLP projections as transformers' Conv1D,
+    which dynamic quantization does not recognise; as nn.Linear they quantize.
+    """
+    import torch
+    from transformers.pytorch_utils import Conv1D
+
+    for parent in list(model.modules()):
+        for name, child in list(parent.named_children()):
+            if isinstance(child, Conv1D):
+                in_features, out_features = child.weight.shape
+                linear = torch.nn.Linear(in_features, out_features)
+                linear.weight.data = child.weight.data.t().contiguous()
+                linear.bias.data = child.bias.data
+                setattr(parent, name, linear)
+    return model
+
 
+def quantize_model(model):
+    """Int8 dynamic quantization of every Linear layer, for CPU inference"""
+    import torch
 
+    model = _conv1d_to_linear(model)
+    return torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
 
 
-def load_model():
-    """Load the trained ML model"""
+def load_model(quantize=None, num_threads=None, bf16=None, variant=None, cascade_margin=None):
+    """Load the trained ML model
+
+    quantize applies int8 dynamic quantization (CPU only), num_threads sets
+    torch's intra-op thread count and bf16 runs inference under bfloat16
+    autocast. variant picks the GPT-2 'teacher', the distilled 'student' or
+    a 'cascade' where the student hands cases it is less sure of than
+    cascade_margin (default: the margin calibrated by distill.py) to GPT-2.
+    Unset options fall back to the SMARTLEX_QUANTIZE, SMARTLEX_THREADS,
+    SMARTLEX_BF16 and SMARTLEX_MODEL environment variables. On failure it
+    returns (None, None, None) and MODEL_LOAD_ERROR says why.
+    """
+    global MODEL_LOAD_ERROR
+    if quantize is None:
+        quantize = _env_flag("SMARTLEX_QUANTIZE")
+    if bf16 is None:
+        bf16 = _env_flag("SMARTLEX_BF16")
+    if num_threads is None and os.environ.get("SMARTLEX_THREADS"):
+        num_threads = int(os.environ["SMARTLEX_THREADS"])
+    variant = variant or _default_variant()
+    if variant not in MODEL_VARIANTS:
+        MODEL_LOAD_ERROR = f"unknown variant {variant!r}, expected one of {', '.join(MODEL_VARIANTS)}"
+        print(f"Model loading failed: {MODEL_LOAD_ERROR}")
+        return None, None, None
+
     try:
+        import torch
+        from transformers import GPT2ForSequenceClassification
+
         device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+        if num_threads:
+            torch.set_num_threads(num_threads)
+
+        # Load tokenizer and model, from the package when there is one
+        import model_package
+
+        packaged = model_package.is_package(MODEL_PACKAGE_DIR)
+        if packaged and variant == 'student':
+            from transformers import AutoTokenizer
+
+            tokenizer = AutoTokenizer.from_pretrained(MODEL_PACKAGE_DIR, local_files_only=True)
+        elif not packaged:
+            with open(TOKENIZER_PATH, 'rb') as f:
+                tokenizer = pickle.load(f)
 
-        # Load tokenizer
-        with open('tokenizer.pkl', 'rb') as f:
-            tokenizer = pickle.load(f)
+        if variant != 'student':
+            if packaged:
+                teacher, tokenizer = model_package.load_package(MODEL_PACKAGE_DIR, device)
+            else:
+                teacher = GPT2ForSequenceClassification.from_pretrained("gpt2", num_labels=2)
+                teacher.load_state_dict(torch.load(MODEL_WEIGHTS_PATH, map_location=device))
+                teacher.to(device)
+            model = teacher = _configure_inference(teacher, device, quantize, bf16)
+        if variant != 'teacher':
+            from distill import CascadeClassifier, load_student
 
-        # Load model
-        model = GPT2ForSequenceClassification.from_pretrained("gpt2", num_labels=2)
-        model.load_state_dict(torch.load('gpt2_legal_model.pth', map_location=device))
-        model.to(device)
+            student, calibrated_margin = load_student(STUDENT_WEIGHTS_PATH, device)
+            model = student = _configure_inference(student, device, quantize, bf16)
+            if variant == 'cascade':
+                margin = calibrated_margin if cascade_margin is None else cascade_margin
+                model = CascadeClassifier(student, teacher, margin)
 
+        MODEL_LOAD_ERROR = None
         return model, tokenizer, device
     except Exception as e:
-        print(f"Model loading failed: {str(e)}")
+        MODEL_LOAD_ERROR = str(e)
+        print(f"Model loading failed: {MODEL_LOAD_ERROR}")
         return None, None, None
 
 
+def _configure_inference(model, device, quantize, bf16):
+    """Apply the optional quantization / bf16 settings to a freshly loaded model in place"""
+    import torch
+
+    model.eval()
+    if quantize and device.type != "cpu":
+        print("Quantization skipped: int8 dynamic quantization only runs on CPU")
+        quantize = False
+    if quantize and bf16:
+        print("bf16 autocast skipped: it cannot be combined with int8 quantization")
+        bf16 = False
+    if quantize:
+        model = quantize_model(model)
+    model.quantized = bool(quantize)
+    model.autocast_dtype = torch.bfloat16 if bf16 else None
+    return model
+
+
+def _autocast(model, device):
+    dtype = getattr(model, 'autocast_dtype', None)
+    if dtype is None:
+        return contextlib.nullcontext()
+    import torch
+    return torch.autocast(device_type=device.type, dtype=dtype)
+
+
+def _model_size_bytes(model):
+    import torch
+
+    buffer = io.BytesIO()
+    torch.save(model.state_dict(), buffer)
+    return buffer.tell()
+
+
+def check_quantized_accuracy(holdout_path, text_column='clause_text', label_column='clause_status',
+                             limit=500, batch_size=16):
+    """Compare int8-quantized and fp32 predictions on a holdout CSV.
+
+    Returns the fraction of texts where both agree, each variant's accuracy
+    against label_column (when present), its inference time and serialized size.
+    """
+    import pandas as pd
+    import torch
+
+    df = pd.read_csv(holdout_path)
+    if limit:
+        df = df.head(limit)
+    texts = df[text_column].fillna("").astype(str).tolist()
+
+    report = {'samples': len(texts)}
+    predictions = {}
+    for name, quantize in (('fp32', False), ('int8', True)):
+        model, tokenizer, device = load_model(quantize=quantize, bf16=False)
+        if model is None:
+            raise RuntimeError(f"Could not load the {name} model")
+
+        start = time.perf_counter()
+        logits = _predict_logits(_encode_many(tokenizer, texts), model, tokenizer, device, batch_size)
+        seconds = time.perf_counter() - start
+
+        predictions[name] = [int(torch.argmax(row).item()) if row is not None else 1 for row in logits]
+        report[name] = {'seconds': seconds, 'size_bytes': _model_size_bytes(model)}
+        if label_column in df:
+            labels = df[label_column].tolist()
+            report[name]['accuracy'] = sum(p == l for p, l in zip(predictions[name], labels)) / max(len(texts), 1)
+
+    report['agreement'] = sum(a == b for a, b in zip(predictions['fp32'], predictions['int8'])) / max(len(texts), 1)
+    report['speedup'] = report['fp32']['seconds'] / max(report['int8']['seconds'], 1e-9)
+    return report
+
+
+def check_variant_accuracy(holdout_path, text_column='clause_text', limit=500, batch_size=16):
+    """Compare the student and the cascade with the GPT-2 teacher on a holdout CSV.
+
+    Returns each variant's agreement with the teacher's predictions, its
+    inference time and speedup over the teacher, and for the cascade the
+    fraction of texts it escalated to GPT-2.
+    """
+    import pandas as pd
+    import torch
+
+    df = pd.read_csv(holdout_path)
+    if limit:
+        df = df.head(limit)
+    texts = df[text_column].fillna("").astype(str).tolist()
+
+    cascade, tokenizer, device = load_model(variant='cascade')
+    if cascade is None:
+        raise RuntimeError("Could not load the teacher and student models")
+    token_ids = _encode_many(tokenizer, texts)
+
+    report = {'samples': len(texts)}
+    predictions = {}
+    for name, model in (('teacher', cascade.teacher), ('student', cascade.student), ('cascade', cascade)):
+        start = time.perf_counter()
+        logits = _predict_logits(token_ids, model, tokenizer, device, batch_size)
+        seconds = time.perf_counter() - start
+        predictions[name] = [int(torch.argmax(row).item()) if row is not None else 1 for row in logits]
+        report[name] = {'seconds': seconds}
+
+    for name in ('student', 'cascade'):
+        report[name]['agreement'] = sum(
+            a == b for a, b in zip(predictions[name], predictions['teacher'])) / max(len(texts), 1)
+        report[name]['speedup'] = report['teacher']['seconds'] / max(report[name]['seconds'], 1e-9)
+    report['cascade']['margin'] = cascade.margin
+    report['cascade']['escalated'] = cascade.escalated / max(cascade.total, 1)
+    return report
+
+
+def _teacher_weights_path():
+    """The weights file load_model() reads the teacher from"""
+    import model_package
+
+    if model_package.is_package(MODEL_PACKAGE_DIR):
+        return model_package.weights_file(MODEL_PACKAGE_DIR)
+    return MODEL_WEIGHTS_PATH
+
+
+class ModelRegistry:
+    """Process-wide cache of the (model, tokenizer, device) tuple from load_model().
+
+    The first get() loads the model; later calls return the same objects to
+    every session and thread. If a weights file changes on disk (the
+    teacher's, and the student's when SMARTLEX_MODEL serves one) the model is
+    reloaded on the next get(), and the swap waits for in-flight inference.
+    """
+
+    def __init__(self, loader=load_model, weights_path=None):
+        self._loader = loader
+        self._weights_path = weights_path
+        self._load_lock = threading.Lock()
+        self._loaded = None
+        self._loaded_mtime = None
+
+    def _resolved_weights_paths(self):
+        paths = [self._weights_path or _teacher_weights_path()]
+        if _default_variant() != 'teacher':
+            paths.append(STUDENT_WEIGHTS_PATH)
+        return paths
+
+    def _weights_mtime(self):
+        """(path, mtime or None) for each watched weights file"""
+        mtimes = []
+        for path in self._resolved_weights_paths():
+            try:
+                mtimes.append((path, os.stat(path).st_mtime_ns))
+            except OSError:
+                mtimes.append((path, None))
+        return tuple(mtimes)
+
+    def get(self):
+        """Return the shared (model, tokenizer, device), loading it if needed"""
+        mtime = self._weights_mtime()
+        loaded = self._loaded
+        if loaded is not None and mtime == self._loaded_mtime:
+            return loaded
+
+        with self._load_lock:
+            if self._loaded is None or mtime != self._loaded_mtime:
+                if self._loaded is not None:
+                    changed = [path for path, _ in set(mtime) - set(self._loaded_mtime or ())] or [
+                        path for path, _ in mtime]
+                    print(f"Reloading model: {', '.join(changed)} changed")
+                fresh = self._loader()
+                with _inference_lock:
+                    self._loaded = fresh
+                    self._loaded_mtime = mtime
+            return self._loaded
+
+    def reload(self):
+        """Drop the cached model and load it again"""
+        with self._load_lock:
+            self._loaded = None
+            self._loaded_mtime = None
+        return self.get()
+
+
+MODEL_REGISTRY = ModelRegistry()
+
+
+def get_model():
+    """Return the process-wide (model, tokenizer, device), loading it once"""
+    return MODEL_REGISTRY.get()
+
+
 def extract_text_from_image(image):
     """Extract text from image using OCR"""
     try:
-        return pytesseract.image_to_string(image)
+        from ocr import ocr_image
+        with stage('ocr'):
+            result = ocr_image(image)
+        CACHE_LOOKUPS.inc(cache='ocr', outcome='hit' if result['cache_hit'] else 'miss')
+        return result['text']
     except Exception as e:
         print(f"OCR failed: {str(e)}")
         return ""
 
 
-def analyze_contract(text, model=None, tokenizer=None, device=None):
-    """Analyze contract text for risks and issues"""
-    analysis = {
+MAX_TOKENS = 512
+WINDOW_OVERLAP = 128
+
+# Above this rule score a contract is Weak and Risky whatever the model says
+HIGH_RISK_SCORE = 60
+
+
+def _new_analysis(text):
+    return {
         'contract_text': text,
         'risk_score': 0,
         'clause_class': 1,
@@ -156,73 +629,90 @@ def analyze_contract(text, model=None, tokenizer=None, device=None):
         'summary': ""
     }
 
-    # 1. GPT-2 Model Prediction
-    if model and tokenizer:
-        try:
-            inputs = tokenizer(text, return_tensors="pt", truncation=True, max_length=512, padding=True)
-            inputs = {k: v.to(device) for k, v in inputs.items()}
 
-            with torch.no_grad():
-                outputs = model(**inputs)
-                analysis['clause_class'] = torch.argmax(outputs.logits, dim=1).item()
-        except Exception as e:
-            print(f"Prediction failed: {str(e)}")
+def _encode_many(tokenizer, texts, max_length=MAX_TOKENS):
+    """Token ids per text, truncated the same way the classifier sees them; memoized per tokenizer"""
+    with stage('tokenize'):
+        return encodings(tokenizer).encode_many(texts, max_length)
+
+
+def _pad_token_id(model, tokenizer):
+    pad_id = tokenizer.pad_token_id if tokenizer.pad_token_id is not None else tokenizer.eos_token_id
+    # GPT-2 ships without a pad token; the classifier needs one to find the last real token of a padded row
+    if model.config.pad_token_id is None:
+        model.config.pad_token_id = pad_id
+    return pad_id
+
+
+def _predict_logits(token_ids, model, tokenizer, device, batch_size=16):
+    """Classify token id sequences in length-sorted, right-padded batches.
+
+    Returns one logits row per sequence in input order, or None for an empty sequence.
+    """
+    import torch
+
+    pad_id = _pad_token_id(model, tokenizer)
+    order = sorted((i for i, ids in enumerate(token_ids) if ids), key=lambda i: len(token_ids[i]))
+    logits = [None] * len(token_ids)
+    count_tokens(sum(len(ids) for ids in token_ids))
 
-    text_lower = text.lower()
+    for start in range(0, len(order), batch_size):
+        batch = order[start:start + batch_size]
+        input_ids, attention_mask = batch_tensors([token_ids[i] for i in batch], pad_id)
+        with stage('forward'), _inference_lock, torch.no_grad(), _autocast(model, device):
+            outputs = model(input_ids=input_ids.to(device), attention_mask=attention_mask.to(device))
+        batch_logits = outputs.logits.float().cpu()
+        for row, i in enumerate(batch):
+            logits[i] = batch_logits[row]
 
-    # 2. Rule-based analysis with academic references
+    return logits
+
+
+def _apply_rules(analysis, matches=None):
+    """Add the rule-based findings to analysis and settle the final risk classification"""
+    with stage('rules'):
+        _score_rules(analysis, scan_rules(analysis['contract_text']) if matches is None else matches)
+        _classify(analysis)
+
+
+def _score_rules(analysis, matches):
+    """Add the rule findings and their points to analysis; independent of the model's verdict"""
     # Ambiguous Terms (5 points each)
-    for term, pattern in {
-        'reasonable efforts': r'\breasonable efforts?\b',
-        'material adverse': r'\bmaterial adverse\b',
-        'sole discretion': r'\bsole discretion\b'
-    }.items():
-        matches = re.findall(pattern, text_lower)
-        if matches:
+    for term, spans in matches['ambiguous_terms'].items():
+        if spans:
             analysis['ambiguities'][term] = {
-                'count': len(matches),
+                'count': len(spans),
                 'reference': RESEARCH_REFERENCES['ambiguous_terms']['terms'][term]
             }
-            analysis['risk_score'] += len(matches) * 5
+            analysis['risk_score'] += len(spans) * 5
             analysis['references'].append(RESEARCH_REFERENCES['ambiguous_terms']['terms'][term])
 
     # Fake Indicators (10 points each)
-    for term, pattern in {
-        'non-binding': r'\bnon-?binding\b',
-        'unenforceable': r'\bunenforceable\b',
-        'without liability': r'\bwithout liability\b'
-    }.items():
-        matches = re.findall(pattern, text_lower)
-        if matches:
+    for term, spans in matches['fake_indicators'].items():
+        if spans:
             analysis['fake_indicators'][term] = {
-                'count': len(matches),
+                'count': len(spans),
                 'reference': RESEARCH_REFERENCES['fake_indicators']['terms'][term]
             }
-            analysis['risk_score'] += len(matches) * 10
+            analysis['risk_score'] += len(spans) * 10
             analysis['references'].append(RESEARCH_REFERENCES['fake_indicators']['terms'][term])
 
     # Modal Verbs Analysis
-    modal_data = {
-        'shall': {'weight': 0.2, 'reference': RESEARCH_REFERENCES['modals']['terms']['shall']},
-        'must': {'weight': 0.1, 'reference': RESEARCH_REFERENCES['modals']['terms']['must']},
-        'may': {'weight': 0.5, 'reference': RESEARCH_REFERENCES['modals']['terms']['may']},
-        'should': {'weight': 0.4, 'reference': RESEARCH_REFERENCES['modals']['terms']['should']}
-    }
-    for verb, data in modal_data.items():
-        matches = re.findall(r'\b' + verb + r'\b', text_lower)
-        if matches:
+    for verb, spans in matches['modals'].items():
+        if spans:
+            reference = RESEARCH_REFERENCES['modals']['terms'][verb]
             analysis['modals'][verb] = {
-                'count': len(matches),
-                'weight': data['weight'],
-                'reference': data['reference']
+                'count': len(spans),
+                'weight': MODAL_WEIGHTS[verb],
+                'reference': reference
             }
-            analysis['risk_score'] += len(matches) * data['weight'] * 10
-            analysis['references'].append(f"{verb}: {data['reference']}")
+            analysis['risk_score'] += len(spans) * MODAL_WEIGHTS[verb] * 10
+            analysis['references'].append(f"{verb}: {reference}")
 
     # Missing Sections (6 points each)
-    required_sections = RESEARCH_REFERENCES['missing_sections']['terms']
-    for section, reference in required_sections.items():
-        if not re.search(r'\b' + section + r'\b', text_lower):
+    for section, spans in matches['missing_sections'].items():
+        if not spans:
+            reference = RESEARCH_REFERENCES['missing_sections']['terms'][section]
             analysis['missing_sections'].append({
                 'section': section,
                 'reference': reference
@@ -230,10 +720,12 @@ def analyze_contract(text, model=None, tokenizer=None, device=None):
             analysis['risk_score'] += 6
             analysis['references'].append(reference)
 
-    # Final risk classification
     analysis['risk_score'] = min(100, analysis['risk_score'])
 
-    if analysis['risk_score'] > 60 or analysis['clause_class'] == 0:
+
+def _classify(analysis):
+    """Final risk classification from the rule score and the model's clause_class"""
+    if analysis['risk_score'] > HIGH_RISK_SCORE or analysis['clause_class'] == 0:
         analysis['contract_strength'] = "Weak"
         analysis['clause_class'] = 0
         analysis['references'].append(
@@ -253,28 +745,561 @@ def analyze_contract(text, model=None, tokenizer=None, device=None):
         f"Risk thresholds from: {RESEARCH_REFERENCES['risk_thresholds']['source']}"
     ])
 
+
+def _predict_truncated(analyses, model, tokenizer, device, batch_size):
+    """Classify each contract from its first MAX_TOKENS tokens"""
+    import torch
+
+    token_ids = _encode_many(tokenizer, [analysis['contract_text'] for analysis in analyses])
+    for analysis, logits in zip(analyses, _predict_logits(token_ids, model, tokenizer, device, batch_size)):
+        if logits is not None:
+            analysis['clause_class'] = int(torch.argmax(logits).item())
+
+
+def _window_spans(length, size=MAX_TOKENS, overlap=WINDOW_OVERLAP):
+    """(start, end) token offsets of overlapping windows covering a sequence"""
+    spans = []
+    start = 0
+    while start < length:
+        end = min(start + size, length)
+        spans.append((start, end))
+        if end == length:
+            break
+        start = end - overlap
+    return spans
+
+
+def _window_key(ids):
+    return hashlib.blake2b(ids, digest_size=16).digest()
+
+
+def _predict_windowed(analyses, model, tokenizer, device, batch_size, confidence_margin=None, reuse=None,
+                      keep=None):
+    """Classify every overlapping window of each contract in shared batches.
+
+    A contract is Risky when its most Risky window is, which for a single
+    window is the same verdict as the truncated pass.
+
+    With confidence_margin set, windows are scored in rounds of one batch,
+    filled in turn with the next unscored window of every pending contract,
+    and a contract stops after the round in which a window's softmax margin
+    P(Risky) - P(Valid) reaches confidence_margin: that window already makes it
+    Risky, so the verdict is unchanged. A contract that never exits costs the
+    same forward passes as without confidence_margin.
+
+    reuse maps _window_key(window ids) to the logits of a window scored
+    earlier, which is not run again; keep, when given, receives the logits of
+    every window of this call the same way. Returns the number of reused windows.
+    """
+    with stage('tokenize'):
+        token_ids = encodings(tokenizer).encode_many([analysis['contract_text'] for analysis in analyses])
+    spans = [_window_spans(len(ids)) for ids in token_ids]
+
+    scored = [[] for _ in analyses]
+    exited = set()
+    reused = 0
+    next_window = [0] * len(analyses)
+    pending = [owner for owner in range(len(analyses)) if spans[owner]]
+    while pending:
+        if confidence_margin is None:
+            windows = [(owner, index) for owner in pending for index in range(len(spans[owner]))]
+        else:
+            windows = []
+            while len(windows) < batch_size:
+                open_owners = [owner for owner in pending if next_window[owner] < len(spans[owner])]
+                if not open_owners:
+                    break
+                for owner in open_owners[:batch_size - len(windows)]:
+                    windows.append((owner, next_window[owner]))
+                    next_window[owner] += 1
+        window_ids = [token_ids[owner][slice(*spans[owner][index])] for owner, index in windows]
+        if reuse is None and keep is None:
+            logits = _predict_logits(window_ids, model, tokenizer, device, batch_size)
+        else:
+            keys = [_window_key(ids) for ids in window_ids]
+            known = reuse or {}
+            missing = [i for i, key in enumerate(keys) if key not in known]
+            fresh = dict(zip(missing, _predict_logits([window_ids[i] for i in missing], model, tokenizer, device,
+                                                      batch_size)))
+            reused += len(keys) - len(missing)
+            logits = [fresh[i] if i in fresh else known[key] for i, key in enumerate(keys)]
+            if keep is not None:
+                keep.update(zip(keys, logits))
+        for (owner, index), row in zip(windows, logits):
+            margin = float(row[0] - row[1])
+            scored[owner].append((margin, index))
+            # P(Risky) - P(Valid) of a two-way softmax is tanh of half the logit difference
+            if confidence_margin is not None and math.tanh(margin / 2) >= confidence_margin:
+                exited.add(owner)
+
+        pending = [owner for owner in pending if confidence_margin is not None
+                   and owner not in exited and next_window[owner] < len(spans[owner])]
+
+    for owner, (analysis, ids, margins) in enumerate(zip(analyses, token_ids, scored)):
+        analysis['windows'] = {'count': len(spans[owner]), 'scored': len(margins), 'risky_window': None}
+        if not margins:
+            continue
+        if len(margins) < len(spans[owner]):
+            analysis['inference_path'] = 'early_exit'
+        margin, index = max(margins)
+        start, end = spans[owner][index]
+        analysis['clause_class'] = 0 if margin >= 0 else 1
+        if analysis['clause_class'] == 0:
+            analysis['windows']['risky_window'] = {
+                'index': index,
+                'start_token': start,
+                'end_token': end,
+                'risky_margin': margin,
+                'excerpt': tokenizer.decode(ids[start:end].tolist())[:300]
+            }
+    return reused
+
+
+def analyze_contract(text, model=None, tokenizer=None, device=None, chunked=False, use_cache=False,
+                     timings=False, short_circuit=False, confidence_margin=None):
+    """Analyze contract text for risks and issues
+
+    With chunked=True the model reads the whole contract in overlapping
+    MAX_TOKENS windows instead of only the first MAX_TOKENS tokens. With
+    use_cache=True a previous result for the same text and model weights is
+    reused, and analysis['cache'] says whether it came from 'memory', 'disk'
+    or was a 'miss'. With timings=True analysis['timings'] holds this call's
+    milliseconds per stage ('tokenize_ms', 'forward_ms', 'rules_ms', ...,
+    'total_ms') and the number of model tokens.
+
+    short_circuit and confidence_margin skip model work that cannot change the
+    verdict; see analyze_contracts(). analysis['inference_path'] says which
+    path was taken.
+    """
+    options = dict(chunked=chunked, use_cache=use_cache, short_circuit=short_circuit,
+                   confidence_margin=confidence_margin)
+    if not timings:
+        return analyze_contracts([text], model, tokenizer, device, **options)[0]
+    with collect_timings() as collected:
+        analysis = analyze_contracts([text], model, tokenizer, device, **options)[0]
+    analysis['timings'] = collected
     return analysis
 
 
-def get_previous_analyses(limit=10):
-    """Retrieve previous analyses from database"""
-    conn = sqlite3.connect("legal_contracts.db")
+def analyze_contracts(texts, model=None, tokenizer=None, device=None, batch_size=16, chunked=False,
+                      use_cache=False, short_circuit=False, confidence_margin=None):
+    """Analyze many contracts with one model forward pass per batch.
+
+    Texts (or their windows when chunked) are sorted by token length so each
+    batch is padded only to its own longest member. Results come back in input
+    order and match analyze_contract().
+
+    With short_circuit=True the rule scan runs first and contracts scoring
+    above HIGH_RISK_SCORE, which are Weak whatever the model says, skip the
+    model. With chunked=True, confidence_margin (0 to 1) stops reading a
+    contract once one window is Risky by at least that softmax margin. Neither
+    changes any classification; skipped contracts just lack the model's
+    'windows' details. analysis['inference_path'] is 'model', 'short_circuit',
+    'early_exit' or 'rules_only' (no model given).
+    """
+    if use_cache:
+        return _analyze_cached(list(texts), model, tokenizer, device, batch_size, chunked, short_circuit,
+                               confidence_margin)
+
+    analyses = [_new_analysis(text) for text in texts]
+    use_model = bool(model and tokenizer)
+    ANALYSES.inc(len(analyses), mode="rules" if not use_model else "chunked" if chunked else "truncated")
+
+    # 1. Rule-based findings and score, which the model's verdict cannot change
+    with stage('rules'):
+        for analysis in analyses:
+            _score_rules(analysis, scan_rules(analysis['contract_text']))
+            analysis['inference_path'] = 'model' if use_model else 'rules_only'
+
+    # 2. GPT-2 Model Prediction, for the contracts whose strength it can still decide
+    to_predict = analyses
+    if short_circuit:
+        to_predict = [analysis for analysis in analyses if analysis['risk_score'] <= HIGH_RISK_SCORE]
+        for analysis in analyses:
+            if use_model and analysis['risk_score'] > HIGH_RISK_SCORE:
+                analysis['inference_path'] = 'short_circuit'
+    if use_model and to_predict:
+        try:
+            if chunked:
+                _predict_windowed(to_predict, model, tokenizer, device, batch_size, confidence_margin)
+            else:
+                _predict_truncated(to_predict, model, tokenizer, device, batch_size)
+        except Exception as e:
+            print(f"Prediction failed: {str(e)}")
+
+    # 3. Final classification with academic references
+    for analysis in analyses:
+        _classify(analysis)
+    return analyses
+
+
+PAGE_SEPARATOR = "\n\n"
+
+
+def analyze_pages(pages, model=None, tokenizer=None, device=None, batch_size=16):
+    """Analyze a multi-page document page by page and roll the results into one analysis.
+
+    pages is any iterable of page texts (or (page_number, text) pairs, as
+    ingest.iter_pages yields), consumed lazily. Each page gets its rule scan
+    and windowed model pass as it arrives. The contract is Risky when any
+    page is, and windows['risky_window'] names the page that drove it.
+    """
+    texts = []
+    matches = {category: {term: [] for term in terms} for category, terms in RULE_ENGINE.categories.items()}
+    offset = 0
+    worst = None
+    window_count = 0
+
+    for number, page in enumerate(pages, start=1):
+        if isinstance(page, tuple):
+            number, page = page
+        if texts:
+            offset += len(PAGE_SEPARATOR)
+        texts.append(page)
+
+        with stage('rules'):
+            for category, terms in scan_rules(page).items():
+                for term, spans in terms.items():
+                    matches[category][term] += [(start + offset, end + offset) for start, end in spans]
+        offset += len(page)
+
+        if model and tokenizer:
+            try:
+                page_analysis = _new_analysis(page)
+                _predict_windowed([page_analysis], model, tokenizer, device, batch_size)
+                window_count += page_analysis['windows']['count']
+                risky = page_analysis['windows']['risky_window']
+                if risky and (worst is None or risky['risky_margin'] > worst['risky_margin']):
+                    worst = dict(risky, page=number)
+            except Exception as e:
+                print(f"Prediction failed on page {number}: {str(e)}")
+
+    analysis = _new_analysis(PAGE_SEPARATOR.join(texts))
+    analysis['pages'] = len(texts)
+    if model and tokenizer:
+        analysis['windows'] = {'count': window_count, 'risky_window': worst}
+        analysis['clause_class'] = 0 if worst else 1
+    _apply_rules(analysis, matches)
+    return analysis
+
+
+def _score_clause(clause):
+    """Rule findings of one clause, as {term: count} per category, and their points"""
+    matches = scan_rules(clause['text'])
+    result = dict(clause, risk_score=0, clause_class=1, risky_margin=None, ambiguities={}, fake_indicators={},
+                  modals={})
+    for category, key, points in (('ambiguous_terms', 'ambiguities', 5), ('fake_indicators', 'fake_indicators', 10)):
+        for term, spans in matches[category].items():
+            if spans:
+                result[key][term] = len(spans)
+                result['risk_score'] += len(spans) * points
+    for verb, spans in matches['modals'].items():
+        if spans:
+            result['modals'][verb] = len(spans)
+            result['risk_score'] += len(spans) * MODAL_WEIGHTS[verb] * 10
+    result['risk_score'] = min(100, result['risk_score'])
+    return result
+
+
+def _score_clauses(clauses, model, tokenizer, device):
+    with stage('rules'):
+        results = [_score_clause(clause) for clause in clauses]
+
+    if model and tokenizer:
+        try:
+            token_ids = _encode_many(tokenizer, [clause['text'] for clause in clauses])
+            for result, logits in zip(results, _predict_logits(token_ids, model, tokenizer, device, len(clauses))):
+                if logits is not None:
+                    result['risky_margin'] = float(logits[0] - logits[1])
+                    result['clause_class'] = 0 if result['risky_margin'] >= 0 else 1
+        except Exception as e:
+            print(f"Clause prediction failed: {str(e)}")
+
+    for result in results:
+        if result['risk_score'] > HIGH_RISK_SCORE:
+            result['clause_class'] = 0
+    return results
+
+
+def iter_clause_analyses(text, model=None, tokenizer=None, device=None, batch_size=8):
+    """Segment a contract into clauses and yield each clause's result as soon as its batch is scored.
+
+    Clauses come lazily from segmentation.iter_clauses, so the first results
+    arrive after one batch of batch_size clauses however long the contract
+    is. Each result is the clause dict ('number', 'section', 'heading',
+    'start', 'end', 'text', ...) plus its rule findings as {term: count}, a
+    rule risk_score without the document-level missing-section points and,
+    with a model, clause_class and the Risky-minus-Valid logit risky_margin.
+    """
+    batch = []
+    for clause in iter_clauses(text):
+        batch.append(clause)
+        if len(batch) == batch_size:
+            yield from _score_clauses(batch, model, tokenizer, device)
+            batch = []
+    if batch:
+        yield from _score_clauses(batch, model, tokenizer, device)
+
+
+class AnalysisSession:
+    """Re-analyzes successive versions of one contract, recomputing only what an edit changed.
+
+    The result is exactly analyze_contract(text, chunked=True, use_cache=use_cache,
+    short_circuit=short_circuit) and shares its entries in the result cache.
+    Each version is cut into segments, one per clause (with the headings and
+    blank lines before it) plus any trailing text, and rule matches are kept
+    per segment text, so only new or changed segments are scanned. The model
+    reads the whole contract in windows as analyze_contract() does; windows
+    whose tokens are unchanged reuse their logits instead of running again.
+    analysis['incremental'] counts the reused and recomputed segments and the
+    reused windows.
+    """
+
+    def __init__(self, model=None, tokenizer=None, device=None, batch_size=16, short_circuit=False,
+                 use_cache=False):
+        self.model = model
+        self.tokenizer = tokenizer
+        self.device = device
+        self.batch_size = batch_size
+        self.short_circuit = short_circuit
+        self.use_cache = use_cache
+        # (segment text, clause offset in it or None) -> rule matches within segment
+        self._segments = {}
+        # _window_key(window token ids) -> logits of that window in the previous version
+        self._windows = {}
+
+    def analyze(self, text, timings=False):
+        if not timings:
+            return self._analyze(text)
+        with collect_timings() as collected:
+            analysis = self._analyze(text)
+        analysis['timings'] = collected
+        return analysis
+
+    def _analyze(self, text):
+        use_model = bool(self.model and self.tokenizer)
+        if self.use_cache:
+            with stage('cache_lookup'):
+                keys, fingerprint = _result_cache_keys([text], self.model, self.tokenizer, True, self.short_circuit,
+                                                       None)
+                cached = RESULT_CACHE.get(keys[0], fingerprint)
+            CACHE_LOOKUPS.inc(cache='result', outcome=cached['cache'] if cached else 'miss')
+            if cached:
+                cached['contract_text'] = text
+                cached['incremental'] = {'segments': 0, 'reused': 0, 'recomputed': 0, 'reused_windows': 0}
+                return cached
+
+        with stage('segment'):
+            clauses = list(iter_clauses(text))
+            bounds = [(0 if i == 0 else clauses[i - 1]['end'], clause['end'], clause['start'])
+                      for i, clause in enumerate(clauses)]
+            if not bounds or bounds[-1][1] < len(text):
+                bounds.append((bounds[-1][1] if bounds else 0, len(text), None))
+            segments = [(text[start:end], None if clause_start is None else clause_start - start)
+                        for start, end, clause_start in bounds]
+
+        # Only segments the previous version did not have are scanned
+        entries = {key: self._segments[key] for key in segments if key in self._segments}
+        reused = sum(1 for key in segments if key in entries)
+        with stage('rules'):
+            for key in segments:
+                if key not in entries:
+                    entries[key] = scan_rules(key[0])
+
+        matches = {category: {term: [] for term in terms} for category, terms in RULE_ENGINE.categories.items()}
+        for (start, _, _), key in zip(bounds, segments):
+            for category, terms in entries[key].items():
+                for term, spans in terms.items():
+                    matches[category][term] += [(a + start, b + start) for a, b in spans]
+
+        analysis = _new_analysis(text)
+        ANALYSES.inc(mode="chunked" if use_model else "rules")
+        analysis['inference_path'] = 'model' if use_model else 'rules_only'
+        with stage('rules'):
+            _score_rules(analysis, matches)
+
+        reused_windows = 0
+        if use_model and self.short_circuit and analysis['risk_score'] > HIGH_RISK_SCORE:
+            analysis['inference_path'] = 'short_circuit'
+        elif use_model:
+            windows = {}
+            try:
+                reused_windows = _predict_windowed([analysis], self.model, self.tokenizer, self.device,
+                                                   self.batch_size, reuse=self._windows, keep=windows)
+                self._windows = windows
+            except Exception as e:
+                print(f"Prediction failed: {str(e)}")
+
+        _classify(analysis)
+        if self.use_cache:
+            with stage('cache_store'):
+                RESULT_CACHE.put(keys[0], fingerprint, analysis)
+            analysis['cache'] = 'miss'
+        analysis['incremental'] = {'segments': len(segments), 'reused': reused, 'recomputed': len(segments) - reused,
+                                   'reused_windows': reused_windows}
+        self._segments = entries
+        return analysis
+
+
+def _result_cache_keys(texts, model, tokenizer, chunked, short_circuit, confidence_margin):
+    """(keys, fingerprint) of texts in RESULT_CACHE for analyze_contracts() with these options"""
+    # Keys say how (and by which model variant) the text was analyzed; the fingerprint ties entries to the
+    # current weights
+    fingerprint = f"{file_fingerprint(_teacher_weights_path())}|{file_fingerprint(STUDENT_WEIGHTS_PATH)}"
+    mode = "rules" if not (model and tokenizer) else "chunked" if chunked else "truncated"
+    if mode != "rules" and getattr(model, 'variant', 'teacher') != 'teacher':
+        mode = f"{model.variant}-{mode}"
+    if mode != "rules":
+        mode += ("+short_circuit" if short_circuit else "") + (
+            f"+exit{confidence_margin}" if chunked and confidence_margin is not None else "")
+        # The disk tier is shared by every process, whatever precision each one runs at
+        if getattr(model, 'quantized', False):
+            mode += "+int8"
+        if getattr(model, 'autocast_dtype', None) is not None:
+            mode += "+" + str(model.autocast_dtype).split('.')[-1]
+    return [f"{text_hash(text)}:{mode}" for text in texts], fingerprint
+
+
+def _analyze_cached(texts, model, tokenizer, device, batch_size, chunked, short_circuit, confidence_margin):
+    with stage('cache_lookup'):
+        keys, fingerprint = _result_cache_keys(texts, model, tokenizer, chunked, short_circuit, confidence_margin)
+        analyses = [RESULT_CACHE.get(key, fingerprint) for key in keys]
+    for analysis in analyses:
+        CACHE_LOOKUPS.inc(cache='result', outcome=analysis['cache'] if analysis else 'miss')
+
+    misses = [i for i, analysis in enumerate(analyses) if analysis is None]
+    fresh = analyze_contracts([texts[i] for i in misses], model, tokenizer, device, batch_size, chunked,
+                              short_circuit=short_circuit, confidence_margin=confidence_margin)
+    with stage('cache_store'):
+        for i, analysis in zip(misses, fresh):
+            RESULT_CACHE.put(keys[i], fingerprint, analysis)
+            analysis['cache'] = 'miss'
+            analyses[i] = analysis
+
+    for text, analysis in zip(texts, analyses):
+        analysis['contract_text'] = text
+    return analyses
+
+
+def _sql_timestamp(value):
+    if isinstance(value, datetime):
+        return value.strftime('%Y-%m-%d %H:%M:%S')
+    if isinstance(value, date):
+        return value.strftime('%Y-%m-%d 00:00:00')
+    return str(value)
+
+
+def _add_date_range(conditions, params, column, start_date, end_date):
+    if start_date is not None:
+        conditions.append(f"{column} >= ?")
+        params.append(_sql_timestamp(start_date))
+    if end_date is not None:
+        if isinstance(end_date, date) and not isinstance(end_date, datetime):
+            conditions.append(f"{column} < ?")
+            params.append(_sql_timestamp(end_date + timedelta(days=1)))
+        else:
+            conditions.append(f"{column} <= ?")
+            params.append(_sql_timestamp(end_date))
+
+
+def get_analyses_page(limit=10, cursor=None, min_risk=None, max_risk=None, strength=None,
+                      classification=None, start_date=None, end_date=None):
+    """One page of previous analyses, newest first, and the cursor of the next page.
+
+    Pages are keyed on (timestamp, id), so each page is an index range scan no
+    matter how deep it is. strength and classification take one value or a
+    list; a date-only end_date includes that whole day. The returned cursor is
+    None on the last page.
+    """
+    _ensure_db()
+    flush_pending_saves()
+
+    conditions, params = [], []
+    if cursor:
+        cursor_timestamp, cursor_id = cursor.rsplit('|', 1)
+        conditions.append("(timestamp, id) < (?, ?)")
+        params += [cursor_timestamp, int(cursor_id)]
+    if min_risk is not None:
+        conditions.append("risk_score >= ?")
+        params.append(min_risk)
+    if max_risk is not None:
+        conditions.append("risk_score <= ?")
+        params.append(max_risk)
+    for column, value in (('strength', strength), ('classification', classification)):
+        if value:
+            values = [value] if isinstance(value, str) else list(value)
+            conditions.append(f"{column} IN ({', '.join('?' for _ in values)})")
+            params += values
+    _add_date_range(conditions, params, "timestamp", start_date, end_date)
+
+    import pandas as pd
+
+    query = f"""
+        SELECT
+            id,
+            timestamp AS cursor_timestamp,
+            datetime(timestamp) as timestamp,
+            classification,
+            risk_score,
+            strength,
+            text_length
+        FROM analyses
+        {'WHERE ' + ' AND '.join(conditions) if conditions else ''}
+        ORDER BY cursor_timestamp DESC, id DESC
+        LIMIT ?
+    """
     try:
-        df = pd.read_sql(f"""
-            SELECT 
-                id,
-                datetime(timestamp) as timestamp,
-                classification,
-                risk_score,
-                strength,
-                length(contract_text) as text_length
-            FROM analyses 
-            ORDER BY timestamp DESC 
-            LIMIT {limit}
-        """, conn, parse_dates=['timestamp'])
-        return df
+        with stage('db_read'), get_pool(DB_PATH).connection() as conn:
+            df = pd.read_sql(query, conn, params=params + [int(limit) + 1], parse_dates=['timestamp'])
     except Exception as e:
         print(f"Database query failed: {str(e)}")
-        return pd.DataFrame()
-    finally:
-        conn.close()
+        return pd.DataFrame(), None
+
+    next_cursor = None
+    if len(df) > limit:
+        df = df.iloc[:limit]
+        next_cursor = f"{df['cursor_timestamp'].iloc[-1]}|{df['id'].iloc[-1]}"
+    return df.drop(columns=['cursor_timestamp']), next_cursor
+
+
+def count_contracts_with_term(term, category=None, start_date=None, end_date=None):
+    """Number of saved analyses in which term was found, e.g. 'sole discretion' this quarter.
+
+    category narrows the match to one finding category; by default any
+    category except missing_sections, where a row means the term was absent.
+    """
+    _ensure_db()
+    flush_pending_saves()
+    conditions = ["f.term = ?"]
+    params = [term]
+    if category:
+        conditions.append("f.category = ?")
+        params.append(category)
+    else:
+        conditions.append("f.category != 'missing_sections'")
+    _add_date_range(conditions, params, "a.timestamp", start_date, end_date)
+
+    with stage('db_read'), get_pool(DB_PATH).connection() as conn:
+        return conn.execute(f"""
+            SELECT COUNT(DISTINCT f.analysis_id)
+            FROM findings f JOIN analyses a ON a.id = f.analysis_id
+            WHERE {' AND '.join(conditions)}
+        """, params).fetchone()[0]
+
+
+def get_contract_text(analysis_id):
+    """Full contract text of a saved analysis, decompressed from the documents table"""
+    _ensure_db()
+    flush_pending_saves()
+    with get_pool(DB_PATH).connection() as conn:
+        row = conn.execute("SELECT contract_text, document_hash FROM analyses WHERE id = ?",
+                           (analysis_id,)).fetchone()
+        if row is None:
+            return None
+        contract_text, doc_hash = row
+        return contract_text if contract_text is not None else load_document(conn, doc_hash)
+
+
+def get_previous_analyses(limit=10, **filters):
+    """Retrieve previous analyses from database"""
+    return get_analyses_page(limit, **filters)[0]
@@ -0,0 +1,223 @@
+"""Analyze a directory, glob or JSONL file of contracts outside the Streamlit UI.
+
+    python batch_analyze.py contracts/ --workers 8 --jsonl-out results.jsonl --db --resume
+
+Each input becomes one analysis: text files are read as they are, images and
+multi-page TIFF/PDF files go through OCR page by page, and JSONL lines supply
+either {"id": ..., "text": ...} or {"path": ...}. Work is spread over a
+process pool in which every worker loads the model once.
+"""
+import argparse
+import glob
+import hashlib
+import json
+import multiprocessing
+import os
+import sys
+import time
+
+import backend_model
+from storage import document_hash
+
+TEXT_EXTENSIONS = {'.txt', '.md', '.text'}
+DOCUMENT_EXTENSIONS = {'.png', '.jpg', '.jpeg', '.tif', '.tiff', '.pdf'}
+
+# Set in each worker process by _init_worker
+_worker_model = (None, None, None)
+_worker_options = {}
+
+
+def _jsonl_item(source, line_number, line):
+    """Work item for one JSONL line, or {'id', 'error'} when the record is unusable"""
+    item_id = f"{source}:{line_number}"
+    try:
+        record = json.loads(line)
+        if not isinstance(record, dict):
+            raise ValueError("expected a JSON object")
+        item = {'id': str(record.get('id', item_id))}
+        if 'text' in record:
+            if not isinstance(record['text'], str):
+                raise TypeError("'text' must be a string")
+            item['text'] = record['text']
+        elif isinstance(record.get('path'), str):
+            item['path'] = record['path']
+        else:
+            raise KeyError("need a string 'text' or 'path'")
+        return item
+    except (ValueError, KeyError, TypeError) as e:
+        return {'id': item_id, 'error': f"line {line_number}: {str(e)}"}
+
+
+def _iter_inputs(sources):
+    """Yield work items {'id', 'path'} or {'id', 'text'} for every input argument, {'id', 'error'} for bad ones"""
+    for source in sources:
+        if os.path.isdir(source):
+            for root, _, files in os.walk(source):
+                for name in sorted(files):
+                    if os.path.splitext(name)[1].lower() in TEXT_EXTENSIONS | DOCUMENT_EXTENSIONS:
+                        path = os.path.join(root, name)
+                        yield {'id': path, 'path': path}
+        elif source.endswith('.jsonl'):
+            with open(source, encoding='utf-8') as f:
+                for line_number, line in enumerate(f, start=1):
+                    if line.strip():
+                        yield _jsonl_item(source, line_number, line)
+        else:
+            for path in sorted(glob.glob(source, recursive=True)) or [source]:
+                yield {'id': path, 'path': path}
+
+
+def _source_hash(item):
+    """Hash used to recognise an input already analyzed: the documents-table hash for text, the file's for scans"""
+    if 'text' in item:
+        return document_hash(item['text'])
+    if os.path.splitext(item['path'])[1].lower() in TEXT_EXTENSIONS:
+        with open(item['path'], encoding='utf-8', errors='replace') as f:
+            return document_hash(f.read())
+    digest = hashlib.sha256()
+    with open(item['path'], 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _init_worker(use_model, num_threads, options):
+    global _worker_model, _worker_options
+    _worker_options = options
+    if use_model:
+        _worker_model = backend_model.load_model(num_threads=num_threads)
+
+
+def _analyze_item(item):
+    """Analyze one work item in a worker; never raises, failures come back as 'error'"""
+    model, tokenizer, device = _worker_model
+    try:
+        if 'text' in item:
+            analysis = backend_model.analyze_contract(item['text'], model, tokenizer, device, **_worker_options)
+        elif os.path.splitext(item['path'])[1].lower() in TEXT_EXTENSIONS:
+            with open(item['path'], encoding='utf-8', errors='replace') as f:
+                analysis = backend_model.analyze_contract(f.read(), model, tokenizer, device, **_worker_options)
+        else:
+            from ingest import iter_pages
+            analysis = backend_model.analyze_pages(iter_pages(item['path']), model, tokenizer, device)
+        return {'id': item['id'], 'source_hash': item['source_hash'], 'analysis': analysis}
+    except Exception as e:
+        return {'id': item['id'], 'source_hash': item['source_hash'], 'error': str(e)}
+
+
+def _already_done(jsonl_out, use_db):
+    done = set()
+    if jsonl_out and os.path.exists(jsonl_out):
+        with open(jsonl_out, encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    record = json.loads(line)
+                    if 'error' not in record:
+                        done.add(record['source_hash'])
+    if use_db:
+        backend_model.init_db()
+        from storage import get_pool
+        with get_pool(backend_model.DB_PATH).connection() as conn:
+            done.update(row[0] for row in conn.execute("SELECT hash FROM documents"))
+            # Scans are known by the hash of the file rather than of their OCR text
+            done.update(row[0] for row in conn.execute(
+                "SELECT DISTINCT source_hash FROM analyses WHERE source_hash IS NOT NULL"))
+    return done
+
+
+def _pending(items, done, stats):
+    for item in items:
+        if 'error' in item:
+            print(f"Skipping {item['id']}: {item['error']}", file=sys.stderr)
+            stats['failed'] += 1
+            continue
+        try:
+            item['source_hash'] = _source_hash(item)
+        except (OSError, ValueError) as e:
+            print(f"Skipping {item['id']}: {str(e)}", file=sys.stderr)
+            stats['failed'] += 1
+            continue
+        if item['source_hash'] in done:
+            stats['skipped'] += 1
+            continue
+        done.add(item['source_hash'])
+        yield item
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Batch contract analysis with a multi-process worker pool")
+    parser.add_argument("inputs", nargs="+", help="directories, glob patterns, files or .jsonl lists of contracts")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="worker processes; 1 runs everything in this process")
+    parser.add_argument("--jsonl-out", help="append one JSON result per document to this file")
+    parser.add_argument("--db", action="store_true", help="save every analysis to legal_contracts.db")
+    parser.add_argument("--resume", action="store_true",
+                        help="skip inputs already in --jsonl-out or, with --db, already saved to the database")
+    parser.add_argument("--no-model", action="store_true", help="rule-based analysis only")
+    parser.add_argument("--chunked", action="store_true", help="let the model read long texts in windows")
+    parser.add_argument("--short-circuit", action="store_true",
+                        help="skip the model for contracts the rules already rate Weak")
+    parser.add_argument("--confidence-margin", type=float,
+                        help="with --chunked, stop at the first window Risky by this softmax margin (0-1)")
+    parser.add_argument("--include-text", action="store_true", help="keep contract_text in the JSONL output")
+    parser.add_argument("--progress-every", type=float, default=5.0, help="seconds between progress lines")
+    args = parser.parse_args(argv)
+
+    if not args.jsonl_out and not args.db:
+        parser.error("nothing to write: pass --jsonl-out and/or --db")
+
+    stats = {'analyzed': 0, 'skipped': 0, 'failed': 0}
+    done = _already_done(args.jsonl_out, args.db) if args.resume else set()
+    items = _pending(_iter_inputs(args.inputs), done, stats)
+
+    workers = max(1, args.workers)
+    # Split the cores between workers so their torch thread pools don't fight
+    options = dict(chunked=args.chunked, short_circuit=args.short_circuit, confidence_margin=args.confidence_margin)
+    init_args = (not args.no_model, max(1, (os.cpu_count() or 1) // workers), options)
+    if workers == 1:
+        _init_worker(*init_args)
+        results = map(_analyze_item, items)
+        pool = None
+    else:
+        pool = multiprocessing.Pool(workers, initializer=_init_worker, initargs=init_args)
+        results = pool.imap_unordered(_analyze_item, items, chunksize=4)
+
+    out = open(args.jsonl_out, 'a', encoding='utf-8') if args.jsonl_out else None
+    started = last_report = time.perf_counter()
+    try:
+        for result in results:
+            if 'error' in result:
+                stats['failed'] += 1
+                print(f"Failed {result['id']}: {result['error']}", file=sys.stderr)
+            else:
+                stats['analyzed'] += 1
+                analysis = result['analysis']
+                if args.db:
+                    backend_model.save_to_db_async(dict(analysis, source_hash=result['source_hash']))
+                if not args.include_text:
+                    result['analysis'] = {k: v for k, v in analysis.items() if k != 'contract_text'}
+            if out:
+                out.write(json.dumps(result) + "\n")
+
+            now = time.perf_counter()
+            if now - last_report >= args.progress_every:
+                last_report = now
+                rate = stats['analyzed'] / (now - started)
+                print(f"{stats['analyzed']} analyzed, {stats['skipped']} skipped, {stats['failed']} failed "
+                      f"({rate:.1f} docs/s)", file=sys.stderr)
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+        if out:
+            out.close()
+        if args.db:
+            backend_model.flush_pending_saves()
+
+    elapsed = time.perf_counter() - started
+    print(json.dumps(dict(stats, seconds=round(elapsed, 2))), file=sys.stderr)
+    return 1 if stats['failed'] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,162 @@
+"""Regression guard: the one-pass rule engine must score exactly like the original per-term regexes.
+
+Runs analyze_contract() without a model on randomized texts built from the
+rule terms, near-misses and word-boundary edge cases, and compares every
+rule finding, the risk score, the strength and the references with a copy
+of the scoring code that predates rule_engine.py:
+
+    python benchmarks/rules_equivalence.py --texts 20000 --seed 0
+"""
+import argparse
+import json
+import os
+import random
+import re
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import backend_model  # noqa: E402
+from backend_model import RESEARCH_REFERENCES  # noqa: E402
+
+COMPARED_KEYS = ('risk_score', 'clause_class', 'contract_strength', 'ambiguities', 'fake_indicators', 'modals',
+                 'missing_sections', 'references')
+
+FRAGMENTS = [
+    'reasonable efforts', 'reasonable effort', 'Reasonable  efforts', 'unreasonable efforts', 'reasonable effortsless',
+    'material adverse', 'immaterial adverse', 'MATERIAL ADVERSE', 'sole discretion', 'sole-discretion',
+    'non-binding', 'nonbinding', 'non binding', 'non--binding', 'unenforceable', 'unenforceable_',
+    'without liability', 'without liabilityy', 'shall', "shall's", 'shallow', 'must', 'mustard', 'may', 'mayor',
+    'May', 'dismay', 'should', 'shoulder', 'governing law', 'governing laws', 'Governing Law', 'termination',
+    'terminations', 'dispute resolution', 'dispute\nresolution', 'the', 'party', 'agrees', '2024', 'x_may',
+    'may2', 'İ', 'ß', 'é', 'Ω', '—', '-', '.', ',', ';', '(', ')', '"', "'", '\n', '\t', '  ',
+]
+
+
+def reference_analysis(text):
+    """Rule findings as computed before rule_engine.py, one regex per term"""
+    analysis = {
+        'risk_score': 0,
+        'clause_class': 1,
+        'contract_strength': "Strong",
+        'ambiguities': {},
+        'fake_indicators': {},
+        'modals': {},
+        'missing_sections': [],
+        'references': []
+    }
+    text_lower = text.lower()
+
+    for term, pattern in {
+        'reasonable efforts': r'\breasonable efforts?\b',
+        'material adverse': r'\bmaterial adverse\b',
+        'sole discretion': r'\bsole discretion\b'
+    }.items():
+        matches = re.findall(pattern, text_lower)
+        if matches:
+            analysis['ambiguities'][term] = {
+                'count': len(matches),
+                'reference': RESEARCH_REFERENCES['ambiguous_terms']['terms'][term]
+            }
+            analysis['risk_score'] += len(matches) * 5
+            analysis['references'].append(RESEARCH_REFERENCES['ambiguous_terms']['terms'][term])
+
+    for term, pattern in {
+        'non-binding': r'\bnon-?binding\b',
+        'unenforceable': r'\bunenforceable\b',
+        'without liability': r'\bwithout liability\b'
+    }.items():
+        matches = re.findall(pattern, text_lower)
+        if matches:
+            analysis['fake_indicators'][term] = {
+                'count': len(matches),
+                'reference': RESEARCH_REFERENCES['fake_indicators']['terms'][term]
+            }
+            analysis['risk_score'] += len(matches) * 10
+            analysis['references'].append(RESEARCH_REFERENCES['fake_indicators']['terms'][term])
+
+    modal_data = {
+        'shall': {'weight': 0.2, 'reference': RESEARCH_REFERENCES['modals']['terms']['shall']},
+        'must': {'weight': 0.1, 'reference': RESEARCH_REFERENCES['modals']['terms']['must']},
+        'may': {'weight': 0.5, 'reference': RESEARCH_REFERENCES['modals']['terms']['may']},
+        'should': {'weight': 0.4, 'reference': RESEARCH_REFERENCES['modals']['terms']['should']}
+    }
+    for verb, data in modal_data.items():
+        matches = re.findall(r'\b' + verb + r'\b', text_lower)
+        if matches:
+            analysis['modals'][verb] = {
+                'count': len(matches),
+                'weight': data['weight'],
+                'reference': data['reference']
+            }
+            analysis['risk_score'] += len(matches) * data['weight'] * 10
+            analysis['references'].append(f"{verb}: {data['reference']}")
+
+    for section, reference in RESEARCH_REFERENCES['missing_sections']['terms'].items():
+        if not re.search(r'\b' + section + r'\b', text_lower):
+            analysis['missing_sections'].append({
+                'section': section,
+                'reference': reference
+            })
+            analysis['risk_score'] += 6
+            analysis['references'].append(reference)
+
+    analysis['risk_score'] = min(100, analysis['risk_score'])
+
+    if analysis['risk_score'] > 60 or analysis['clause_class'] == 0:
+        analysis['contract_strength'] = "Weak"
+        analysis['clause_class'] = 0
+        analysis['references'].append(
+            "High risk (>60): " + RESEARCH_REFERENCES['risk_thresholds']['thresholds']['high'])
+    elif analysis['risk_score'] > 30:
+        analysis['contract_strength'] = "Moderate"
+        analysis['references'].append(
+            "Moderate risk (30-60): " + RESEARCH_REFERENCES['risk_thresholds']['thresholds']['moderate'])
+    else:
+        analysis['contract_strength'] = "Strong"
+        analysis['references'].append("Low risk (<30): " + RESEARCH_REFERENCES['risk_thresholds']['thresholds']['low'])
+
+    analysis['references'].extend([
+        f"Analysis based on: {RESEARCH_REFERENCES['ambiguous_terms']['source']}",
+        f"Analysis based on: {RESEARCH_REFERENCES['fake_indicators']['source']}",
+        f"Risk thresholds from: {RESEARCH_REFERENCES['risk_thresholds']['source']}"
+    ])
+    return analysis
+
+
+def random_text(rng):
+    parts = []
+    for _ in range(rng.randrange(0, 40)):
+        parts.append(rng.choice(FRAGMENTS))
+        parts.append(rng.choice(('', ' ', ' ', ' ', '\n', '-', '_')))
+    return "".join(parts)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--texts", type=int, default=20000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    rng = random.Random(args.seed)
+    mismatches = []
+    for _ in range(args.texts):
+        text = random_text(rng)
+        analysis = backend_model.analyze_contract(text)
+        actual = {key: analysis[key] for key in COMPARED_KEYS}
+        if actual != reference_analysis(text):
+            mismatches.append(text)
+
+    result = {
+        'check': 'rules_equivalence',
+        'texts': args.texts,
+        'seed': args.seed,
+        'mismatches': len(mismatches),
+        'first_mismatch': mismatches[0] if mismatches else None
+    }
+    print(json.dumps(result, indent=2))
+    return 0 if not mismatches else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
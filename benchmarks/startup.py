@@ -0,0 +1,67 @@
+"""Startup-time guard for the rules-only path of backend_model.
+
+Runs a fresh interpreter that imports backend_model and analyzes one short
+contract without a model, several times, and fails when the median wall time
+exceeds the budget or when a heavy dependency or the database was touched:
+
+    python benchmarks/startup.py --runs 5 --budget-ms 200
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+HEAVY_MODULES = ('torch', 'transformers', 'pandas', 'pytesseract', 'PIL')
+
+CHILD = """
+import json, sys
+import backend_model
+backend_model.analyze_contract("The Supplier shall use reasonable efforts to deliver. Governing law: New York.")
+print(json.dumps([name for name in %r if name in sys.modules]))
+""" % (HEAVY_MODULES,)
+
+
+def measure(runs):
+    timings, heavy = [], set()
+    with tempfile.TemporaryDirectory() as workdir:
+        env = dict(os.environ, PYTHONPATH=REPO_ROOT + os.pathsep + os.environ.get('PYTHONPATH', ''))
+        for _ in range(runs):
+            start = time.perf_counter()
+            output = subprocess.run([sys.executable, "-c", CHILD], cwd=workdir, env=env,
+                                    check=True, capture_output=True, text=True).stdout
+            timings.append((time.perf_counter() - start) * 1000)
+            heavy.update(json.loads(output.strip().splitlines()[-1]))
+        created_db = os.path.exists(os.path.join(workdir, "legal_contracts.db"))
+    return timings, sorted(heavy), created_db
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--budget-ms", type=float, default=200.0)
+    args = parser.parse_args(argv)
+
+    timings, heavy, created_db = measure(args.runs)
+    result = {
+        'benchmark': 'startup_rules_only',
+        'runs': args.runs,
+        'median_ms': statistics.median(timings),
+        'min_ms': min(timings),
+        'max_ms': max(timings),
+        'budget_ms': args.budget_ms,
+        'heavy_modules_imported': heavy,
+        'created_db': created_db
+    }
+    print(json.dumps(result, indent=2))
+    ok = result['median_ms'] <= args.budget_ms and not heavy and not created_db
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
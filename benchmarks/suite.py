@@ -0,0 +1,293 @@
+"""Performance benchmarks for the model, rule, OCR and database paths.
+
+Every case runs in its own interpreter, so its peak RSS is its own, and
+reports throughput plus p50/p95/p99 latency. Results are written as JSON and
+can be compared against an earlier run to catch regressions:
+
+    python benchmarks/suite.py --output current.json
+    python benchmarks/suite.py --baseline baseline.json --tolerance 0.25
+
+Cases:
+    rules_scan        scan_rules() alone, per text size
+    analyze_rules     analyze_contract() without the model, per text size
+    analyze_model     analyze_contract(chunked=True) with the model, per text size
+    ocr               ocr_image() on a generated page (no OCR cache), per line count
+    save_to_db        save_to_db() into a database already holding N analyses
+    history           get_previous_analyses() on a database holding N analyses
+
+Seeded databases are kept in --data-dir and reused by later runs.
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.dirname(BENCH_DIR)
+
+TEXT_SIZES = (1024, 10 * 1024, 100 * 1024, 1024 * 1024)
+OCR_LINES = (10, 40)
+DB_ROWS = (10_000, 100_000, 1_000_000)
+
+
+def _percentile(sorted_values, q):
+    index = (len(sorted_values) - 1) * q
+    low = int(index)
+    high = min(low + 1, len(sorted_values) - 1)
+    return sorted_values[low] + (sorted_values[high] - sorted_values[low]) * (index - low)
+
+
+def _peak_rss_mb():
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def time_calls(fn, iterations, max_seconds, warmup=1):
+    """Call fn() up to iterations times (at least once) within max_seconds; latencies in ms"""
+    for _ in range(warmup):
+        fn()
+    latencies = []
+    budget_end = time.perf_counter() + max_seconds
+    while len(latencies) < iterations and (not latencies or time.perf_counter() < budget_end):
+        start = time.perf_counter()
+        fn()
+        latencies.append((time.perf_counter() - start) * 1000)
+    return latencies
+
+
+def summarize(latencies, bytes_per_call=None):
+    ordered = sorted(latencies)
+    total_s = sum(ordered) / 1000
+    result = {
+        'iterations': len(ordered),
+        'throughput_per_s': len(ordered) / total_s if total_s else None,
+        'p50_ms': _percentile(ordered, 0.50),
+        'p95_ms': _percentile(ordered, 0.95),
+        'p99_ms': _percentile(ordered, 0.99),
+        'mean_ms': total_s * 1000 / len(ordered),
+        'peak_rss_mb': _peak_rss_mb()
+    }
+    if bytes_per_call:
+        result['throughput_mb_per_s'] = bytes_per_call * len(ordered) / total_s / (1024 * 1024) if total_s else None
+    return result
+
+
+# --- Child side: one case per process ----------------------------------------
+
+def _load_backend(model_dir):
+    import backend_model
+
+    backend_model.MODEL_WEIGHTS_PATH = os.path.join(model_dir, 'gpt2_legal_model.pth')
+    backend_model.TOKENIZER_PATH = os.path.join(model_dir, 'tokenizer.pkl')
+    backend_model.MODEL_PACKAGE_DIR = os.path.join(model_dir, 'gpt2_legal_model')
+    return backend_model
+
+
+SEED_ANALYSIS_SQL = '''
+    INSERT INTO analyses (
+        document_hash, text_length, classification, risk_score, strength,
+        ambiguities, fake_indicators, modals, missing_sections, source_hash, timestamp
+    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+'''
+
+
+def seed_database(backend_model, rows, batch_size=10_000, distinct_texts=1000):
+    """Fill the working directory's database with `rows` analyses spread over the past two years"""
+    import random
+    from datetime import datetime, timedelta
+
+    from synthetic import contract_text
+    from storage import document_hash, get_pool, store_documents
+
+    backend_model.init_db()
+    with get_pool(backend_model.DB_PATH).connection() as conn:
+        existing = conn.execute("SELECT COUNT(*) FROM analyses").fetchone()[0]
+    if existing >= rows:
+        return
+
+    rng = random.Random(rows)
+    texts = [contract_text(rng.choice((1024, 4096, 16384)), seed=i) for i in range(distinct_texts)]
+    analyses = [backend_model.analyze_contract(text) for text in texts]
+    hashes = [document_hash(text) for text in texts]
+    start = datetime.now() - timedelta(days=730)
+
+    with get_pool(backend_model.DB_PATH).connection() as conn:
+        store_documents(conn, dict(zip(hashes, texts)))
+        next_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM analyses").fetchone()[0] + 1
+    done = existing
+    while done < rows:
+        count = min(batch_size, rows - done)
+        analysis_rows, finding_rows = [], []
+        for offset in range(count):
+            k = rng.randrange(distinct_texts)
+            timestamp = start + timedelta(seconds=rng.randrange(730 * 86400))
+            analysis_rows.append(backend_model._analysis_row(analyses[k], hashes[k])
+                                 + (timestamp.strftime("%Y-%m-%d %H:%M:%S"),))
+            finding_rows += backend_model._finding_rows(next_id + offset, analyses[k])
+        with get_pool(backend_model.DB_PATH).connection() as conn:
+            conn.executemany(SEED_ANALYSIS_SQL, analysis_rows)
+            conn.executemany(backend_model.INSERT_FINDING_SQL, finding_rows)
+        next_id += count
+        done += count
+
+
+def run_case(case, param, args):
+    backend_model = _load_backend(args.model_dir)
+    from synthetic import contract_text
+
+    if case in ('rules_scan', 'analyze_rules', 'analyze_model'):
+        text = contract_text(param)
+        if case == 'rules_scan':
+            fn = lambda: backend_model.scan_rules(text)
+        elif case == 'analyze_rules':
+            fn = lambda: backend_model.analyze_contract(text)
+        else:
+            model, tokenizer, device = backend_model.load_model()
+            if model is None:
+                return {'skipped': "model could not be loaded"}
+            fn = lambda: backend_model.analyze_contract(text, model, tokenizer, device, chunked=True)
+        return summarize(time_calls(fn, args.iterations, args.max_seconds), bytes_per_call=len(text))
+
+    if case == 'ocr':
+        try:
+            import pytesseract
+            pytesseract.get_tesseract_version()
+        except Exception as e:
+            return {'skipped': f"tesseract unavailable: {str(e)}"}
+        from ocr import ocr_image
+        from synthetic import contract_image
+
+        image = contract_image(lines=param)
+        return summarize(time_calls(lambda: ocr_image(image, use_cache=False), args.iterations, args.max_seconds))
+
+    if case in ('save_to_db', 'history'):
+        seed_database(backend_model, param)
+        if case == 'save_to_db':
+            analysis = backend_model.analyze_contract(contract_text(4096, seed=param))
+            fn = lambda: backend_model.save_to_db(analysis)
+        else:
+            fn = lambda: backend_model.get_previous_analyses(limit=10)
+        return summarize(time_calls(fn, args.iterations, args.max_seconds))
+
+    raise ValueError(f"Unknown case {case}")
+
+
+# --- Parent side ---------------------------------------------------------------
+
+def plan(args):
+    cases = []
+    for case in args.cases:
+        if case in ('rules_scan', 'analyze_rules'):
+            params = args.text_sizes
+        elif case == 'analyze_model':
+            params = args.model_text_sizes
+        elif case == 'ocr':
+            params = args.ocr_lines
+        else:
+            params = args.db_rows
+        cases += [(case, param) for param in params]
+    return cases
+
+
+def spawn(case, param, args, data_dir):
+    # Database cases get a directory per size so seeded databases are reused
+    workdir = os.path.join(data_dir, f"rows_{param}") if case in ('save_to_db', 'history') else data_dir
+    os.makedirs(workdir, exist_ok=True)
+    command = [sys.executable, os.path.abspath(__file__), "--child", case, str(param),
+               "--iterations", str(args.iterations), "--max-seconds", str(args.max_seconds),
+               "--model-dir", args.model_dir]
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join([REPO_ROOT, BENCH_DIR, os.environ.get('PYTHONPATH', '')]))
+    completed = subprocess.run(command, cwd=workdir, env=env, capture_output=True, text=True)
+    if completed.returncode != 0:
+        return {'error': completed.stderr.strip().splitlines()[-1] if completed.stderr.strip() else "failed"}
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def compare(results, baseline, tolerance):
+    """Cases whose p50 latency grew by more than tolerance (a fraction) over the baseline"""
+    previous = {(r['case'], r['param']): r for r in baseline.get('results', [])}
+    regressions = []
+    for result in results:
+        before = previous.get((result['case'], result['param']))
+        if not before or 'p50_ms' not in before or 'p50_ms' not in result:
+            continue
+        change = result['p50_ms'] / before['p50_ms'] - 1 if before['p50_ms'] else 0.0
+        result['baseline_p50_ms'] = before['p50_ms']
+        result['p50_change'] = change
+        if change > tolerance:
+            regressions.append(f"{result['case']}[{result['param']}]: p50 {before['p50_ms']:.3f} -> "
+                               f"{result['p50_ms']:.3f} ms ({change:+.0%})")
+    return regressions
+
+
+def _int_list(value):
+    return [int(item) for item in value.split(",") if item]
+
+
+def main(argv=None):
+    all_cases = ('rules_scan', 'analyze_rules', 'analyze_model', 'ocr', 'save_to_db', 'history')
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--cases", type=lambda v: v.split(","), default=list(all_cases),
+                        help="comma-separated subset of: " + ", ".join(all_cases))
+    parser.add_argument("--text-sizes", type=_int_list, default=list(TEXT_SIZES), help="bytes, comma-separated")
+    parser.add_argument("--model-text-sizes", type=_int_list, default=list(TEXT_SIZES))
+    parser.add_argument("--ocr-lines", type=_int_list, default=list(OCR_LINES))
+    parser.add_argument("--db-rows", type=_int_list, default=list(DB_ROWS))
+    parser.add_argument("--iterations", type=int, default=50)
+    parser.add_argument("--max-seconds", type=float, default=30.0, help="time budget per case")
+    parser.add_argument("--model-dir", default=REPO_ROOT, help="directory with the weights and tokenizer")
+    parser.add_argument("--data-dir", default=None, help="where seeded databases are kept (default: temporary)")
+    parser.add_argument("--output", help="write the results JSON here as well as to stdout")
+    parser.add_argument("--baseline", help="results JSON of an earlier run to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.20, help="allowed p50 slowdown before failing")
+    parser.add_argument("--child", nargs=2, metavar=("CASE", "PARAM"), help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+    args.model_dir = os.path.abspath(args.model_dir)
+
+    if args.child:
+        print(json.dumps(run_case(args.child[0], int(args.child[1]), args)))
+        return 0
+
+    unknown = set(args.cases) - set(all_cases)
+    if unknown:
+        parser.error(f"unknown cases: {', '.join(sorted(unknown))}")
+
+    with tempfile.TemporaryDirectory() as scratch:
+        data_dir = os.path.abspath(args.data_dir) if args.data_dir else scratch
+        results = []
+        for case, param in plan(args):
+            result = {'case': case, 'param': param, **spawn(case, param, args, data_dir)}
+            results.append(result)
+            print(f"{case}[{param}]: " + (f"p50 {result['p50_ms']:.3f} ms" if 'p50_ms' in result
+                                          else result.get('skipped') or result.get('error')), file=sys.stderr)
+
+    report = {
+        'created': time.strftime("%Y-%m-%dT%H:%M:%S"),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'results': results
+    }
+    regressions = []
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        report['regressions'] = regressions
+
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    for line in regressions:
+        print("REGRESSION " + line, file=sys.stderr)
+    return 1 if regressions or any('error' in r for r in results) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
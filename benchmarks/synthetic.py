@@ -0,0 +1,48 @@
+"""Deterministic synthetic contracts and scanned-page images for the benchmarks"""
+import random
+
+PARTIES = ("the Supplier", "the Customer", "the Licensor", "the Licensee", "the Contractor", "the Company")
+
+CLAUSES = (
+    "{a} shall deliver the Goods to {b} within thirty (30) days of the Order Date.",
+    "{a} may terminate this Agreement upon written notice to {b}.",
+    "{a} must indemnify {b} against all claims arising from a breach of this Agreement.",
+    "{a} should use reasonable efforts to resolve any dispute with {b} amicably.",
+    "Payment is due within a reasonable time of invoice, at the sole discretion of {a}.",
+    "{a} will provide the Services as soon as possible and in a timely manner.",
+    "This Agreement is governed by the governing law of the State of New York.",
+    "Either party may refer a dispute to binding arbitration under the dispute resolution rules.",
+    "{a} keeps all Confidential Information of {b} in strict confidentiality.",
+    "The term of this Agreement begins on the Effective Date and continues for two (2) years.",
+    "{a} warrants that the Deliverables conform to the Specification, notwithstanding any non-binding estimate.",
+    "Neither party is liable for delay caused by a force majeure event beyond its control.",
+)
+
+
+def contract_text(size_bytes, seed=0):
+    """A contract-like text of roughly size_bytes bytes built from varied clauses"""
+    rng = random.Random(seed)
+    parts, length, number = [], 0, 1
+    while length < size_bytes:
+        a, b = rng.sample(PARTIES, 2)
+        clause = f"{number}. " + rng.choice(CLAUSES).format(a=a.capitalize(), b=b) + "\n"
+        parts.append(clause)
+        length += len(clause)
+        number += 1
+    return "".join(parts)[:size_bytes]
+
+
+def contract_image(lines=40, seed=0, width=2550, line_height=60):
+    """A white US-letter-width page with `lines` lines of black contract text, as a PIL image"""
+    from PIL import Image, ImageDraw, ImageFont
+
+    try:
+        font = ImageFont.load_default(size=36)
+    except TypeError:
+        font = ImageFont.load_default()
+    text_lines = contract_text(lines * 90, seed).splitlines()[:lines]
+    image = Image.new("RGB", (width, line_height * (len(text_lines) + 4)), "white")
+    draw = ImageDraw.Draw(image)
+    for i, line in enumerate(text_lines):
+        draw.text((150, line_height * (i + 2)), line, fill="black", font=font)
+    return image
@@ -0,0 +1,280 @@
+"""Distill the GPT-2 clause classifier into a small hashed n-gram student.
+
+    python distill.py legal_docs_modified.csv --epochs 5
+
+The student reads the same GPT-2 token ids as the teacher, averages learned
+embeddings of hashed 1-3-grams and classifies them with a small MLP. It
+learns from the teacher's logits (cached next to the token cache), so
+unlabelled contracts work too. The cascade margin, the student confidence
+above which its answer agrees with the teacher on at least
+--target-agreement of the validation split, is saved in the checkpoint.
+Writes student_model.pth for load_model(variant='student' or 'cascade').
+"""
+import argparse
+import functools
+import hashlib
+import json
+import os
+import sys
+import time
+from types import SimpleNamespace
+
+import numpy as np
+import torch
+
+from training import LengthBucketSampler, TokenCache, pad_batch
+
+# Multipliers of the n-gram hash, one per position in the n-gram
+HASH_PRIMES = (1000003, 2000029, 3000017)
+
+
+class HashedNgramClassifier(torch.nn.Module):
+    """Mean of hashed token n-gram embeddings fed to a one-hidden-layer classifier.
+
+    Called like GPT2ForSequenceClassification: model(input_ids=...,
+    attention_mask=...).logits, with right-padded batches.
+    """
+
+    variant = 'student'
+
+    def __init__(self, num_buckets=1 << 18, dim=64, ngrams=(1, 2, 3)):
+        super().__init__()
+        self.config = SimpleNamespace(pad_token_id=None, num_buckets=num_buckets, dim=dim, ngrams=tuple(ngrams))
+        self.embedding = torch.nn.Embedding(num_buckets, dim)
+        self.classifier = torch.nn.Sequential(torch.nn.Linear(dim, dim), torch.nn.ReLU(), torch.nn.Linear(dim, 2))
+
+    def forward(self, input_ids, attention_mask=None):
+        if attention_mask is None:
+            attention_mask = torch.ones_like(input_ids)
+        total = torch.zeros(input_ids.shape[0], self.config.dim, device=input_ids.device)
+        count = torch.zeros(input_ids.shape[0], 1, device=input_ids.device)
+        length = input_ids.shape[1]
+        for n in self.config.ngrams:
+            if length < n:
+                continue
+            hashed = n * HASH_PRIMES[-1]
+            mask = torch.ones_like(input_ids[:, :length - n + 1], dtype=torch.bool)
+            for i in range(n):
+                hashed = hashed + input_ids[:, i:length - n + 1 + i] * HASH_PRIMES[i]
+                mask = mask & attention_mask[:, i:length - n + 1 + i].bool()
+            vectors = self.embedding(hashed % self.config.num_buckets) * mask.unsqueeze(-1)
+            total = total + vectors.sum(dim=1)
+            count = count + mask.sum(dim=1, keepdim=True)
+        return SimpleNamespace(logits=self.classifier(total / count.clamp(min=1)))
+
+
+class CascadeClassifier(torch.nn.Module):
+    """Student first; rows whose student softmax margin is below margin are re-scored by the teacher"""
+
+    variant = 'cascade'
+
+    def __init__(self, student, teacher, margin):
+        super().__init__()
+        self.student = student
+        self.teacher = teacher
+        self.margin = margin
+        self.config = teacher.config
+        self.autocast_dtype = getattr(teacher, 'autocast_dtype', None)
+        self.quantized = getattr(teacher, 'quantized', False)
+        self.total = 0
+        self.escalated = 0
+
+    def forward(self, input_ids, attention_mask=None):
+        if attention_mask is None:
+            attention_mask = torch.ones_like(input_ids)
+        logits = self.student(input_ids=input_ids, attention_mask=attention_mask).logits.float()
+        confidence = torch.tanh((logits[:, 0] - logits[:, 1]).abs() / 2)
+        rows = torch.nonzero(confidence < self.margin).flatten()
+        self.total += len(logits)
+        self.escalated += len(rows)
+        if len(rows):
+            # Right padding: the uncertain rows only need their own longest length
+            mask = attention_mask[rows]
+            width = max(1, int(mask.sum(dim=1).max()))
+            teacher_logits = self.teacher(input_ids=input_ids[rows, :width], attention_mask=mask[:, :width]).logits
+            logits = logits.clone()
+            logits[rows] = teacher_logits.float()
+        return SimpleNamespace(logits=logits)
+
+
+def save_student(model, path, margin):
+    torch.save({'config': {'num_buckets': model.config.num_buckets, 'dim': model.config.dim,
+                           'ngrams': list(model.config.ngrams)},
+                'margin': margin,
+                'state_dict': model.state_dict()}, path)
+
+
+def load_student(path, device):
+    """(student model on device, calibrated cascade margin) from a save_student() checkpoint"""
+    checkpoint = torch.load(path, map_location=device)
+    model = HashedNgramClassifier(**checkpoint['config'])
+    model.load_state_dict(checkpoint['state_dict'])
+    model.to(device)
+    return model, checkpoint['margin']
+
+
+def _collate_indexed(samples, pad_id):
+    batch = pad_batch([(ids, label) for ids, label, _ in samples], pad_id)
+    batch['index'] = torch.tensor([index for _, _, index in samples], dtype=torch.long)
+    return batch
+
+
+class _Indexed(torch.utils.data.Dataset):
+    def __init__(self, data):
+        self.data = data
+
+    def __len__(self):
+        return len(self.data)
+
+    def __getitem__(self, index):
+        return self.data[index] + (index,)
+
+
+def _batches(data, batch_size, pad_id, shuffle=False, seed=0, indices=None, num_workers=0):
+    lengths = data.lengths if indices is None else data.lengths[indices]
+    sampler = LengthBucketSampler(lengths, batch_size, shuffle=shuffle, seed=seed)
+    subset = _Indexed(data) if indices is None else torch.utils.data.Subset(_Indexed(data), indices)
+    return sampler, torch.utils.data.DataLoader(subset, batch_sampler=sampler, num_workers=num_workers,
+                                                collate_fn=functools.partial(_collate_indexed, pad_id=pad_id))
+
+
+def teacher_logits(teacher, data, device, batch_size=32, weights_path=None):
+    """Teacher logits for every sample of a TokenCache, as an (N, 2) array cached beside the tokens"""
+    from result_cache import file_fingerprint
+
+    tag = hashlib.sha256(file_fingerprint(weights_path).encode()).hexdigest()[:16] if weights_path else "model"
+    path = os.path.join(data.path, f"teacher_logits_{tag}.npy")
+    if weights_path and os.path.exists(path):
+        return np.load(path)
+
+    logits = np.zeros((len(data), 2), dtype=np.float32)
+    _, loader = _batches(data, batch_size, teacher.config.pad_token_id)
+    teacher.eval()
+    with torch.no_grad():
+        for batch in loader:
+            out = teacher(input_ids=batch['input_ids'].to(device), attention_mask=batch['attention_mask'].to(device))
+            logits[batch['index'].numpy()] = out.logits.float().cpu().numpy()
+    np.save(path, logits)
+    return logits
+
+
+def distill(student, data, targets, indices, epochs=5, batch_size=64, lr=2e-3, temperature=2.0, device=None,
+            seed=42, num_workers=0):
+    """Train student to match the teacher's temperature-softened logits on data[indices]"""
+    device = device or next(student.parameters()).device
+    targets = torch.from_numpy(np.asarray(targets, dtype=np.float32))
+    optimizer = torch.optim.AdamW(student.parameters(), lr=lr)
+    sampler, loader = _batches(data, batch_size, 0, shuffle=True, seed=seed, indices=indices,
+                               num_workers=num_workers)
+    history = []
+    for epoch in range(epochs):
+        sampler.set_epoch(epoch)
+        student.train()
+        total_loss, started = 0.0, time.perf_counter()
+        for batch in loader:
+            logits = student(input_ids=batch['input_ids'].to(device),
+                             attention_mask=batch['attention_mask'].to(device)).logits
+            soft = torch.softmax(targets[batch['index']].to(device) / temperature, dim=1)
+            loss = torch.nn.functional.kl_div(torch.log_softmax(logits / temperature, dim=1), soft,
+                                              reduction='batchmean') * temperature ** 2
+            optimizer.zero_grad(set_to_none=True)
+            loss.backward()
+            optimizer.step()
+            total_loss += loss.item()
+        result = {'epoch': epoch + 1, 'loss': total_loss / max(1, len(sampler)),
+                  'seconds': time.perf_counter() - started}
+        print(f"Epoch {epoch + 1} - loss: {result['loss']:.4f}")
+        history.append(result)
+    return history
+
+
+def student_logits(student, data, indices, device, batch_size=128):
+    student.eval()
+    logits = np.zeros((len(indices), 2), dtype=np.float32)
+    position = {index: i for i, index in enumerate(indices)}
+    _, loader = _batches(data, batch_size, 0, indices=indices)
+    with torch.no_grad():
+        for batch in loader:
+            out = student(input_ids=batch['input_ids'].to(device), attention_mask=batch['attention_mask'].to(device))
+            logits[[position[int(i)] for i in batch['index']]] = out.logits.float().cpu().numpy()
+    return logits
+
+
+def calibrate_margin(student_out, teacher_out, target_agreement=0.99):
+    """Smallest student softmax margin above which it agrees with the teacher on target_agreement of samples"""
+    confidence = np.abs(np.tanh((student_out[:, 0] - student_out[:, 1]) / 2))
+    agree = student_out.argmax(axis=1) == teacher_out.argmax(axis=1)
+    order = np.argsort(-confidence)
+    # Agreement among the k most confident samples, for every k
+    running = np.cumsum(agree[order]) / np.arange(1, len(order) + 1)
+    passing = np.nonzero(running >= target_agreement)[0]
+    if not len(passing):
+        return 1.0
+    return float(confidence[order[passing[-1]]])
+
+
+def distill_from_csv(csv_path, text_column='clause_text', cache_dir='token_cache', student_out='student_model.pth',
+                     sample=None, validation_size=0.1, target_agreement=0.99, seed=42, **distill_options):
+    """Distill the loaded GPT-2 teacher into a student over a CSV's texts; returns a report dict"""
+    import pandas as pd
+
+    import backend_model
+
+    teacher, tokenizer, device = backend_model.load_model(variant='teacher', quantize=False)
+    if teacher is None:
+        raise RuntimeError("Could not load the teacher model")
+    backend_model._pad_token_id(teacher, tokenizer)
+
+    df = pd.read_csv(csv_path)
+    if sample:
+        df = df.sample(sample, random_state=seed)
+    texts = df[text_column].fillna("").astype(str).tolist()
+    data = TokenCache.build(texts, [0] * len(texts), tokenizer, cache_dir)
+    targets = teacher_logits(teacher, data, device, weights_path=backend_model._teacher_weights_path())
+
+    order = np.random.default_rng(seed).permutation(len(data))
+    split = int(len(order) * (1 - validation_size))
+    train_idx, valid_idx = order[:split].tolist(), order[split:].tolist()
+
+    student = HashedNgramClassifier().to(device)
+    history = distill(student, data, targets, train_idx, device=device, seed=seed, **distill_options)
+
+    predicted = student_logits(student, data, valid_idx, device)
+    expected = targets[valid_idx]
+    margin = calibrate_margin(predicted, expected, target_agreement)
+    save_student(student, student_out, margin)
+
+    confident = np.abs(np.tanh((predicted[:, 0] - predicted[:, 1]) / 2)) >= margin
+    return {
+        'samples': len(data),
+        'history': history,
+        'student_agreement': float((predicted.argmax(1) == expected.argmax(1)).mean()) if len(valid_idx) else None,
+        'cascade_margin': margin,
+        'escalation_rate': float(1 - confident.mean()) if len(valid_idx) else None
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Distill the GPT-2 clause classifier into a compact student")
+    parser.add_argument("csv", help="contracts or clauses to distill on; labels are not needed")
+    parser.add_argument("--text-column", default="clause_text")
+    parser.add_argument("--cache-dir", default="token_cache")
+    parser.add_argument("--sample", type=int, help="use a random sample of this many rows")
+    parser.add_argument("--epochs", type=int, default=5)
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--lr", type=float, default=2e-3)
+    parser.add_argument("--temperature", type=float, default=2.0)
+    parser.add_argument("--target-agreement", type=float, default=0.99,
+                        help="teacher agreement the cascade must keep on the validation split")
+    parser.add_argument("--student-out", default="student_model.pth")
+    args = parser.parse_args(argv)
+
+    report = distill_from_csv(args.csv, args.text_column, args.cache_dir, args.student_out, args.sample,
+                              target_agreement=args.target_agreement, epochs=args.epochs,
+                              batch_size=args.batch_size, lr=args.lr, temperature=args.temperature)
+    print(json.dumps(report, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
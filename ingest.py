@@ -0,0 +1,79 @@
+from PIL import Image, ImageSequence
+
+from ocr import ocr_image
+
+try:
+    import pypdf
+except ImportError:
+    pypdf = None
+
+try:
+    import pypdfium2
+except ImportError:
+    pypdfium2 = None
+
+# Resolution pages without a text layer are rendered at before OCR
+RENDER_DPI = 300
+
+
+def _rewind(source):
+    if hasattr(source, 'seek'):
+        source.seek(0)
+
+
+def is_pdf(source):
+    """True if a path or binary file object holds a PDF"""
+    if hasattr(source, 'read'):
+        _rewind(source)
+        header = source.read(5)
+        _rewind(source)
+    else:
+        with open(source, 'rb') as f:
+            header = f.read(5)
+    return header.startswith(b'%PDF')
+
+
+def count_pages(source):
+    """Number of pages (PDF) or frames (images, multi-frame TIFF) in a document"""
+    if is_pdf(source):
+        if pypdf is None:
+            raise RuntimeError("Reading PDFs needs the pypdf package")
+        count = len(pypdf.PdfReader(source).pages)
+    else:
+        with Image.open(source) as image:
+            count = getattr(image, 'n_frames', 1)
+    _rewind(source)
+    return count
+
+
+def iter_pages(source):
+    """Yield (page_number, text) for each page of a document, holding one page at a time.
+
+    source is a path or binary file object. PDF pages are read from their
+    text layer (pypdf). A page without one is rendered and OCR'd when
+    pypdfium2 is installed. Any other file is opened with PIL, and each frame
+    (one for PNG/JPEG, many for a multi-frame TIFF) is OCR'd in turn.
+    """
+    if is_pdf(source):
+        if pypdf is None:
+            raise RuntimeError("Reading PDFs needs the pypdf package")
+        reader = pypdf.PdfReader(source)
+        renderer = None
+        try:
+            for index, page in enumerate(reader.pages):
+                text = page.extract_text() or ""
+                if not text.strip():
+                    if pypdfium2 is None:
+                        print(f"Page {index + 1} has no text layer; install pypdfium2 to OCR it")
+                    else:
+                        renderer = renderer or pypdfium2.PdfDocument(source)
+                        text = ocr_image(renderer[index].render(scale=RENDER_DPI / 72).to_pil())['text']
+                yield index + 1, text
+        finally:
+            if renderer is not None:
+                renderer.close()
+        return
+
+    with Image.open(source) as image:
+        for index, frame in enumerate(ImageSequence.Iterator(image)):
+            yield index + 1, ocr_image(frame)['text']
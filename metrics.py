@@ -0,0 +1,172 @@
+"""In-process metrics: counters and latency histograms, exported in Prometheus text format.
+
+backend_model records every pipeline stage here. Dump the registry with
+REGISTRY.render() (served on /metrics by service.py) or REGISTRY.write(path).
+"""
+import bisect
+import contextlib
+import os
+import threading
+import time
+
+# Seconds; covers a sub-millisecond rule scan up to a long windowed model pass
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _label_text(labels):
+    if not labels:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in labels)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(labels, escaped)) + "}"
+
+
+def _number(value):
+    return repr(float(value)) if value != float("inf") else "+Inf"
+
+
+class Counter:
+    """A monotonically increasing value per label set"""
+
+    kind = "counter"
+
+    def __init__(self, name, help_text):
+        self.name = name
+        self.help = help_text
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(tuple(sorted(labels.items())), 0)
+
+    def lines(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_label_text(key)} {_number(value)}" for key, value in items]
+
+
+class Histogram:
+    """Observation counts in fixed cumulative buckets, plus their sum and count, per label set"""
+
+    kind = "histogram"
+
+    def __init__(self, name, help_text, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(sorted(labels.items()))
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def lines(self):
+        with self._lock:
+            items = sorted((key, (list(counts), total, count)) for key, (counts, total, count) in self._series.items())
+        lines = []
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                lines.append(f"{self.name}_bucket{_label_text(key + (('le', _number(bound)),))} {cumulative}")
+            lines.append(f"{self.name}_sum{_label_text(key)} {_number(total)}")
+            lines.append(f"{self.name}_count{_label_text(key)} {count}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _get_or_create(self, cls, name, *args):
+        with self._lock:
+            if name not in self._metrics:
+                self._metrics[name] = cls(name, *args)
+            return self._metrics[name]
+
+    def counter(self, name, help_text):
+        return self._get_or_create(Counter, name, help_text)
+
+    def histogram(self, name, help_text, buckets=DEFAULT_BUCKETS):
+        return self._get_or_create(Histogram, name, help_text, buckets)
+
+    def render(self):
+        """Every metric in the Prometheus text exposition format"""
+        with self._lock:
+            metrics = sorted(self._metrics.values(), key=lambda metric: metric.name)
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines += metric.lines()
+        return "\n".join(lines) + "\n"
+
+    def write(self, path):
+        """Write render() to path atomically, e.g. for node_exporter's textfile collector"""
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            f.write(self.render())
+        os.replace(tmp_path, path)
+
+
+REGISTRY = Registry()
+
+STAGE_SECONDS = REGISTRY.histogram("smartlex_stage_seconds", "Time spent in each analysis pipeline stage")
+TOKENS = REGISTRY.counter("smartlex_model_tokens_total", "Tokens fed to the classifier, padding excluded")
+CACHE_LOOKUPS = REGISTRY.counter("smartlex_cache_lookups_total", "Cache lookups by cache and outcome")
+ANALYSES = REGISTRY.counter("smartlex_analyses_total", "Contracts analyzed, by analysis mode")
+ROWS_WRITTEN = REGISTRY.counter("smartlex_db_rows_written_total", "Analyses written to SQLite")
+
+_local = threading.local()
+
+
+@contextlib.contextmanager
+def stage(name):
+    """Time the block into STAGE_SECONDS, and into the thread's collect_timings() if one is open"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        STAGE_SECONDS.observe(elapsed, stage=name)
+        collected = getattr(_local, 'timings', None)
+        if collected is not None:
+            key = f"{name}_ms"
+            collected[key] = collected.get(key, 0.0) + elapsed * 1000
+
+
+def count_tokens(count):
+    TOKENS.inc(count)
+    collected = getattr(_local, 'timings', None)
+    if collected is not None:
+        collected['tokens'] = collected.get('tokens', 0) + count
+
+
+@contextlib.contextmanager
+def collect_timings():
+    """Gather this thread's stage durations (as '<stage>_ms') and model token count into a dict"""
+    outer = getattr(_local, 'timings', None)
+    collected = _local.timings = {}
+    started = time.perf_counter()
+    try:
+        yield collected
+    finally:
+        collected['total_ms'] = (time.perf_counter() - started) * 1000
+        _local.timings = outer
+        if outer is not None:
+            for key, value in collected.items():
+                if key != 'total_ms':
+                    outer[key] = outer.get(key, 0) + value
@@ -0,0 +1,137 @@
+"""Self-contained model packages: config, fast tokenizer and safetensors weights in one directory.
+
+    python model_package.py --weights gpt2_legal_model.pth --tokenizer tokenizer.pkl --out gpt2_legal_model
+
+load_package() needs no network access and does not unpickle anything. The
+weights are memory-mapped copy-on-write straight from model.safetensors, so
+loading reads only the pages inference touches and every worker process
+that loads the same package shares one copy in the page cache.
+"""
+import argparse
+import json
+import mmap
+import os
+import pickle
+import struct
+import sys
+
+WEIGHTS_FILE = 'model.safetensors'
+
+# safetensors dtype names -> torch dtype attribute names
+DTYPES = {'F64': 'float64', 'F32': 'float32', 'F16': 'float16', 'BF16': 'bfloat16', 'I64': 'int64',
+          'I32': 'int32', 'I16': 'int16', 'I8': 'int8', 'U8': 'uint8', 'BOOL': 'bool'}
+
+# GPT-2 sizes by embedding width; the head count is not recoverable from the weights
+HEADS_BY_WIDTH = {768: 12, 1024: 16, 1280: 20, 1600: 25}
+
+
+def is_package(path):
+    return os.path.isfile(os.path.join(path, WEIGHTS_FILE)) and os.path.isfile(os.path.join(path, 'config.json'))
+
+
+def weights_file(path):
+    return os.path.join(path, WEIGHTS_FILE)
+
+
+def _config_from_state_dict(state_dict, n_head=None):
+    from transformers import GPT2Config
+
+    width = state_dict['transformer.wte.weight'].shape[1]
+    layers = 1 + max(int(key.split('.')[2]) for key in state_dict if key.startswith('transformer.h.'))
+    config = GPT2Config(
+        vocab_size=state_dict['transformer.wte.weight'].shape[0],
+        n_positions=state_dict['transformer.wpe.weight'].shape[0],
+        n_embd=width,
+        n_layer=layers,
+        n_head=n_head or HEADS_BY_WIDTH.get(width, 12),
+        num_labels=state_dict['score.weight'].shape[0]
+    )
+    return config
+
+
+def convert(weights_path, tokenizer_path, out_dir, n_head=None):
+    """Write a package from a state dict saved with torch.save() and a pickled GPT-2 tokenizer.
+
+    The config is read off the weight shapes; n_head is only needed for a
+    model whose width is not one of the standard GPT-2 sizes.
+    """
+    import tempfile
+
+    import torch
+    from transformers import GPT2ForSequenceClassification, GPT2TokenizerFast, PreTrainedTokenizerFast
+
+    with open(tokenizer_path, 'rb') as f:
+        tokenizer = pickle.load(f)
+    if not isinstance(tokenizer, PreTrainedTokenizerFast):
+        # The Rust tokenizer is built from the slow tokenizer's vocab and merges files
+        with tempfile.TemporaryDirectory() as tmp:
+            tokenizer.save_pretrained(tmp)
+            tokenizer = GPT2TokenizerFast.from_pretrained(tmp)
+    if tokenizer.pad_token is None:
+        tokenizer.pad_token = tokenizer.eos_token
+    tokenizer.save_pretrained(out_dir)
+
+    state_dict = torch.load(weights_path, map_location='cpu')
+    config = _config_from_state_dict(state_dict, n_head)
+    config.bos_token_id = config.eos_token_id = tokenizer.eos_token_id
+    config.pad_token_id = tokenizer.pad_token_id
+    model = GPT2ForSequenceClassification(config)
+    model.load_state_dict(state_dict)
+    model.save_pretrained(out_dir, safe_serialization=True, max_shard_size="100GB")
+    return out_dir
+
+
+def mmap_safetensors(path):
+    """Tensors of a safetensors file backed by a private memory map of it, without copying"""
+    import torch
+
+    with open(path, 'rb') as f:
+        header_size = struct.unpack('<Q', f.read(8))[0]
+        header = json.loads(f.read(header_size))
+        # ACCESS_COPY: writable for torch.frombuffer, yet pages stay shared until something writes
+        buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY)
+
+    start = 8 + header_size
+    tensors = {}
+    for name, info in header.items():
+        if name == '__metadata__':
+            continue
+        dtype = getattr(torch, DTYPES[info['dtype']])
+        begin, end = info['data_offsets']
+        if end == begin:
+            tensors[name] = torch.empty(info['shape'], dtype=dtype)
+            continue
+        count = (end - begin) // torch.empty(0, dtype=dtype).element_size()
+        tensors[name] = torch.frombuffer(buffer, dtype=dtype, count=count, offset=start + begin).view(info['shape'])
+    return tensors
+
+
+def load_package(path, device):
+    """(model, tokenizer) from a package directory, offline; weights stay memory-mapped on CPU"""
+    from transformers import AutoTokenizer, GPT2Config, GPT2ForSequenceClassification
+    from transformers.modeling_utils import no_init_weights
+
+    tokenizer = AutoTokenizer.from_pretrained(path, local_files_only=True)
+    config = GPT2Config.from_pretrained(path, local_files_only=True)
+    # Parameters are allocated but never written before the mapped tensors replace them
+    with no_init_weights():
+        model = GPT2ForSequenceClassification(config)
+    model.load_state_dict(mmap_safetensors(weights_file(path)), assign=True)
+    return model.to(device), tokenizer
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Convert gpt2_legal_model.pth + tokenizer.pkl to a model package")
+    parser.add_argument("--weights", default="gpt2_legal_model.pth")
+    parser.add_argument("--tokenizer", default="tokenizer.pkl")
+    parser.add_argument("--out", default="gpt2_legal_model")
+    parser.add_argument("--heads", type=int, help="attention heads, for non-standard model widths")
+    args = parser.parse_args(argv)
+
+    convert(args.weights, args.tokenizer, args.out, args.heads)
+    print(f"Wrote {args.out}: " + ", ".join(sorted(os.listdir(args.out))))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,133 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from storage import get_pool
+
+
+def normalize_text(text):
+    """Text with unified line endings and no surrounding whitespace, as used for cache keys"""
+    return text.replace('\r\n', '\n').replace('\r', '\n').strip()
+
+
+def text_hash(text):
+    return hashlib.sha256(normalize_text(text).encode('utf-8')).hexdigest()
+
+
+def file_fingerprint(path):
+    """Cheap identity of a file on disk that changes whenever it is rewritten"""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return "missing"
+    return f"{stat.st_size}:{stat.st_mtime_ns}"
+
+
+class ResultCache:
+    """Two-tier cache of analysis results: an in-memory LRU over a SQLite table.
+
+    Entries are stored with the fingerprint of the model that produced them.
+    When a call arrives with a different fingerprint every older entry is
+    dropped from both tiers. The disk tier evicts least recently used rows
+    once their payloads exceed max_disk_bytes.
+    """
+
+    def __init__(self, db_path, memory_entries=256, max_disk_bytes=256 * 1024 * 1024):
+        self.db_path = db_path
+        self.memory_entries = memory_entries
+        self.max_disk_bytes = max_disk_bytes
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._fingerprint = None
+        self._disk_bytes = None
+
+    @contextmanager
+    def _connection(self):
+        with get_pool(self.db_path).connection() as conn:
+            if self._disk_bytes is None:
+                conn.execute('''
+                    CREATE TABLE IF NOT EXISTS analysis_cache (
+                        cache_key TEXT PRIMARY KEY,
+                        fingerprint TEXT NOT NULL,
+                        payload TEXT NOT NULL,
+                        size INTEGER NOT NULL,
+                        accessed REAL NOT NULL
+                    )
+                ''')
+                conn.execute('CREATE INDEX IF NOT EXISTS idx_analysis_cache_accessed ON analysis_cache(accessed)')
+                self._disk_bytes = conn.execute('SELECT COALESCE(SUM(size), 0) FROM analysis_cache').fetchone()[0]
+            yield conn
+
+    def _check_fingerprint(self, fingerprint):
+        if fingerprint == self._fingerprint:
+            return
+        self._memory.clear()
+        with self._connection() as conn:
+            conn.execute('DELETE FROM analysis_cache WHERE fingerprint != ?', (fingerprint,))
+            self._disk_bytes = conn.execute('SELECT COALESCE(SUM(size), 0) FROM analysis_cache').fetchone()[0]
+        self._fingerprint = fingerprint
+
+    def get(self, key, fingerprint):
+        """Cached analysis for key, with 'cache' set to the tier that served it, or None"""
+        with self._lock:
+            self._check_fingerprint(fingerprint)
+            payload = self._memory.get(key)
+            if payload is not None:
+                self._memory.move_to_end(key)
+                tier = 'memory'
+            else:
+                with self._connection() as conn:
+                    row = conn.execute('SELECT payload FROM analysis_cache WHERE cache_key = ?', (key,)).fetchone()
+                    if row is None:
+                        return None
+                    conn.execute('UPDATE analysis_cache SET accessed = ? WHERE cache_key = ?', (time.time(), key))
+                payload = row[0]
+                self._remember(key, payload)
+                tier = 'disk'
+
+        analysis = json.loads(payload)
+        analysis['cache'] = tier
+        return analysis
+
+    def put(self, key, fingerprint, analysis):
+        """Store an analysis (without its contract text) under key"""
+        payload = json.dumps({k: v for k, v in analysis.items() if k not in ('contract_text', 'cache')})
+        with self._lock:
+            self._check_fingerprint(fingerprint)
+            self._remember(key, payload)
+            with self._connection() as conn:
+                old = conn.execute('SELECT size FROM analysis_cache WHERE cache_key = ?', (key,)).fetchone()
+                conn.execute('INSERT OR REPLACE INTO analysis_cache VALUES (?, ?, ?, ?, ?)',
+                             (key, fingerprint, payload, len(payload), time.time()))
+                self._disk_bytes += len(payload) - (old[0] if old else 0)
+                self._evict(conn)
+
+    def _remember(self, key, payload):
+        self._memory[key] = payload
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def _evict(self, conn):
+        """Drop least recently used rows until the disk tier fits in max_disk_bytes"""
+        while self._disk_bytes > self.max_disk_bytes:
+            rows = conn.execute('SELECT cache_key, size FROM analysis_cache ORDER BY accessed LIMIT 100').fetchall()
+            if not rows:
+                self._disk_bytes = 0
+                return
+            for key, size in rows:
+                conn.execute('DELETE FROM analysis_cache WHERE cache_key = ?', (key,))
+                self._disk_bytes -= size
+                if self._disk_bytes <= self.max_disk_bytes:
+                    return
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            with self._connection() as conn:
+                conn.execute('DELETE FROM analysis_cache')
+            self._disk_bytes = 0
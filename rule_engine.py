@@ -0,0 +1,33 @@
+import re
+
+
+class RuleEngine:
+    """Finds every rule term in a text with one pass of a precompiled alternation.
+
+    categories maps a category name to its terms, in scoring order. patterns
+    overrides the regex of a term that is not matched literally. Each term is
+    matched between word boundaries, exactly like a separate
+    re.findall(r'\\b' + pattern + r'\\b', text) would, as long as no two terms
+    can match overlapping text (true for RESEARCH_REFERENCES).
+    """
+
+    def __init__(self, categories, patterns=None):
+        patterns = patterns or {}
+        self.categories = {category: list(terms) for category, terms in categories.items()}
+        self._groups = {}
+
+        alternatives = []
+        for category, terms in self.categories.items():
+            for term in terms:
+                group = f"t{len(alternatives)}"
+                self._groups[group] = (category, term)
+                alternatives.append(f"(?P<{group}>{patterns.get(term, re.escape(term))})")
+        self._regex = re.compile(r'\b(?:' + '|'.join(alternatives) + r')\b')
+
+    def scan(self, text_lower):
+        """Map category -> term -> [(start, end), ...] for every match in text_lower"""
+        found = {category: {term: [] for term in terms} for category, terms in self.categories.items()}
+        for match in self._regex.finditer(text_lower):
+            category, term = self._groups[match.lastgroup]
+            found[category][term].append(match.span())
+        return found
@@ -0,0 +1,111 @@
+import re
+
+# "1.", "1.2", "1.2.3", "4)", "(a)", "(iv)", "IV." at the start of a line
+NUMBERED_RE = re.compile(r'[ \t]*((?:\d+\.)+\d*|\d+\)|\([a-zA-Z0-9]{1,4}\)|[IVXLC]+\.)[ \t]+(?=\S)')
+# "Article 3", "Section 4.2:", "Schedule B -"
+LABELLED_RE = re.compile(r'[ \t]*((?:article|section|clause|schedule)[ \t]+(?:\d+(?:\.\d+)*|[IVXLC]+|[A-Z]))\b[.:\-]?[ \t]*',
+                         re.IGNORECASE)
+SENTENCE_END_RE = re.compile(r'(?<=[.;!?])\s+(?=["(\[]?[A-Z0-9])')
+LINE_RE = re.compile(r'[^\n]*\n?')
+
+MAX_CLAUSE_CHARS = 2000
+
+
+def _is_caps_heading(line):
+    stripped = line.strip()
+    letters = [c for c in stripped if c.isalpha()]
+    return (0 < len(stripped) <= 80 and len(letters) >= 3 and all(c.isupper() for c in letters)
+            and not stripped.endswith(('.', ';', ',')))
+
+
+def _is_top_level(number):
+    # "3." or "3" or "Article III" open a section; "3.1", "(a)", "4)" are clauses inside it
+    return bool(re.fullmatch(r'\d+\.?|[IVXLC]+\.', number)) or number.split()[0].lower() in ('article', 'section')
+
+
+def _split_long(text, start, max_chars):
+    """(start, end) offsets of sentence groups of at most about max_chars within text[start:]"""
+    pieces, piece_start, last_break = [], 0, 0
+    for match in SENTENCE_END_RE.finditer(text):
+        if match.start() - piece_start > max_chars and last_break > piece_start:
+            pieces.append((piece_start, last_break))
+            piece_start = last_break + len(text[last_break:]) - len(text[last_break:].lstrip())
+        last_break = match.start()
+    if len(text) - piece_start > max_chars and piece_start < last_break:
+        pieces.append((piece_start, last_break))
+        piece_start = last_break + len(text[last_break:]) - len(text[last_break:].lstrip())
+    pieces.append((piece_start, len(text)))
+    return [(start + a, start + b) for a, b in pieces if text[a:b].strip()]
+
+
+def iter_clauses(text, max_chars=MAX_CLAUSE_CHARS):
+    """Lazily split a contract into clauses.
+
+    A clause starts at a numbered line ("4.2", "(b)"), a labelled line
+    ("Section 7:") or after a blank line, and a clause longer than max_chars
+    is cut at sentence boundaries. Upper-case heading lines and top-level
+    numbers set the section the following clauses belong to.
+
+    Yields {'index', 'number', 'section', 'heading', 'start', 'end', 'text'}
+    where text == contract[start:end].
+    """
+    section = None
+    heading = None
+    index = 0
+    block_start = None
+    block_number = None
+
+    def emit(start, end, number):
+        nonlocal index
+        chunk = text[start:end]
+        start += len(chunk) - len(chunk.lstrip())
+        end -= len(chunk) - len(chunk.rstrip())
+        for piece_start, piece_end in _split_long(text[start:end], start, max_chars) if end > start else []:
+            yield {
+                'index': index,
+                'number': number,
+                'section': section,
+                'heading': heading,
+                'start': piece_start,
+                'end': piece_end,
+                'text': text[piece_start:piece_end]
+            }
+            index += 1
+
+    for match in LINE_RE.finditer(text):
+        line = match.group()
+        if not line:
+            break
+        line_start = match.start()
+
+        if not line.strip():
+            if block_start is not None:
+                yield from emit(block_start, line_start, block_number)
+                block_start = None
+            continue
+
+        numbered = NUMBERED_RE.match(line) or LABELLED_RE.match(line)
+        if numbered or _is_caps_heading(line):
+            if block_start is not None:
+                yield from emit(block_start, line_start, block_number)
+                block_start = None
+            if not numbered:
+                heading = line.strip()
+                continue
+
+            block_number = numbered.group(1).rstrip('.')
+            if _is_top_level(numbered.group(1)):
+                section = block_number
+                heading = None
+                rest = line[numbered.end():]
+                # "1. DEFINITIONS" is a section heading, not a clause
+                if _is_caps_heading(rest) or not rest.strip():
+                    heading = rest.strip() or None
+                    continue
+            block_start = line_start
+        elif block_start is None:
+            block_start = line_start
+            block_number = None
+
+    if block_start is not None:
+        yield from emit(block_start, len(text), block_number)
@@ -0,0 +1,304 @@
+"""Local HTTP service for machine clients of SMARTLEXML.
+
+    python service.py --port 8080 --max-batch-size 16 --max-wait-ms 10
+
+Endpoints:
+    POST /analyze          {"text": "..."}        -> analysis
+    POST /analyze/batch    {"texts": ["...", ...]} -> {"analyses": [...]}
+    GET  /history?limit=&cursor=&min_risk=&max_risk=&strength=&classification=&start_date=&end_date=
+    GET  /health           liveness, plus whether load_model() succeeded
+    GET  /ready            200 once the model is loaded (or --no-model), 503 before or if it failed to load
+    GET  /metrics          per-stage timings and counters in Prometheus text format
+
+Concurrent analysis requests are pooled into micro-batches so one forward
+pass serves many clients. Requests beyond --max-pending are refused with 503;
+a batch is accepted or refused as a whole.
+"""
+import argparse
+import asyncio
+import json
+import sys
+from datetime import date, datetime
+from urllib.parse import parse_qs, urlsplit
+
+import backend_model
+from metrics import REGISTRY
+
+STATUS_TEXT = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+               413: "Payload Too Large", 500: "Internal Server Error", 503: "Service Unavailable"}
+
+
+# Largest page /history returns, whatever limit asks for
+MAX_HISTORY_LIMIT = 100
+
+
+def _parse_date(value):
+    """A date for YYYY-MM-DD (so end_date covers the whole day), else an ISO datetime"""
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        return datetime.fromisoformat(value)
+
+
+class Overloaded(Exception):
+    pass
+
+
+class MicroBatcher:
+    """Groups concurrently submitted texts into batches for run_batch(texts) -> results.
+
+    A batch is dispatched when max_batch_size texts are waiting or max_wait_ms
+    after its first text arrived, whichever comes first. run_batch runs in a
+    worker thread, one batch at a time.
+    """
+
+    def __init__(self, run_batch, max_batch_size=16, max_wait_ms=10, max_pending=1000):
+        self.run_batch = run_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+        self.max_pending = max_pending
+        self.pending = 0
+        self._queue = asyncio.Queue()
+
+    async def submit(self, text):
+        return (await self.submit_many([text]))[0]
+
+    async def submit_many(self, texts):
+        """Results for all of texts, or Overloaded before any is queued if they don't all fit"""
+        # No await between the check and the reservation, so concurrent requests can't both pass it
+        if self.pending + len(texts) > self.max_pending:
+            raise Overloaded()
+        self.pending += len(texts)
+        loop = asyncio.get_running_loop()
+        futures = [loop.create_future() for _ in texts]
+        try:
+            for text, future in zip(texts, futures):
+                self._queue.put_nowait((text, future))
+            return await asyncio.gather(*futures)
+        finally:
+            self.pending -= len(texts)
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.max_wait_ms / 1000
+            while len(batch) < self.max_batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            batch = [(text, future) for text, future in batch if not future.done()]
+            if not batch:
+                continue
+            try:
+                results = await loop.run_in_executor(None, self.run_batch, [text for text, _ in batch])
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+            else:
+                for (_, future), result in zip(batch, results):
+                    if not future.done():
+                        future.set_result(result)
+
+
+class AnalysisService:
+    def __init__(self, use_model=True, chunked=False, save=False, max_batch_size=16, max_wait_ms=10,
+                 max_pending=1000, max_body_bytes=10 * 1024 * 1024, short_circuit=False, confidence_margin=None):
+        self.use_model = use_model
+        self.chunked = chunked
+        self.short_circuit = short_circuit
+        self.confidence_margin = confidence_margin
+        self.save = save
+        self.max_body_bytes = max_body_bytes
+        self.model_loaded = False
+        self.ready = False
+        self.load_error = None
+        self.batcher = MicroBatcher(self._analyze_batch, max_batch_size, max_wait_ms, max_pending)
+
+    def _analyze_batch(self, texts):
+        model, tokenizer, device = backend_model.get_model() if self.use_model else (None, None, None)
+        analyses = backend_model.analyze_contracts(texts, model, tokenizer, device, batch_size=len(texts),
+                                                   chunked=self.chunked, short_circuit=self.short_circuit,
+                                                   confidence_margin=self.confidence_margin)
+        results = []
+        for analysis in analyses:
+            if self.save:
+                backend_model.save_to_db_async(analysis)
+            results.append({k: v for k, v in analysis.items() if k != 'contract_text'})
+        return results
+
+    async def start(self, host, port):
+        loop = asyncio.get_running_loop()
+        loop.create_task(self.batcher.run())
+        if self.use_model:
+            loop.create_task(self._load_model())
+        else:
+            self.ready = True
+        server = await asyncio.start_server(self._handle_connection, host, port)
+        print(f"SMARTLEXML service listening on http://{host}:{port}")
+        return server
+
+    async def _load_model(self):
+        model, _, _ = await asyncio.get_running_loop().run_in_executor(None, backend_model.get_model)
+        self.model_loaded = model is not None
+        # Without its model the service is not ready; /ready keeps answering 503 with the reason
+        self.ready = self.model_loaded
+        if not self.model_loaded:
+            self.load_error = backend_model.MODEL_LOAD_ERROR or "load_model() failed"
+
+    async def _handle_connection(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    break
+                method, target, version = request_line.decode('latin-1').split()
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+
+                length = int(headers.get('content-length', 0))
+                if length > self.max_body_bytes:
+                    await self._respond(writer, 413, {'error': f"Body over {self.max_body_bytes} bytes"}, False)
+                    break
+                body = await reader.readexactly(length) if length else b''
+
+                status, payload = await self._route(method, target, body)
+                keep_alive = version == 'HTTP/1.1' and headers.get('connection', '').lower() != 'close'
+                await self._respond(writer, status, payload, keep_alive)
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def _respond(self, writer, status, payload, keep_alive):
+        if isinstance(payload, str):
+            body, content_type = payload.encode('utf-8'), "text/plain; version=0.0.4"
+        else:
+            body, content_type = json.dumps(payload, default=str).encode('utf-8'), "application/json"
+        head = [f"HTTP/1.1 {status} {STATUS_TEXT[status]}",
+                f"Content-Type: {content_type}",
+                f"Content-Length: {len(body)}",
+                f"Connection: {'keep-alive' if keep_alive else 'close'}"]
+        if status == 503:
+            head.append("Retry-After: 1")
+        writer.write(("\r\n".join(head) + "\r\n\r\n").encode('latin-1') + body)
+        await writer.drain()
+
+    async def _route(self, method, target, body):
+        url = urlsplit(target)
+        try:
+            if url.path == '/health' and method == 'GET':
+                return 200, {'status': 'ok', 'model_loaded': self.model_loaded, 'ready': self.ready,
+                             'pending': self.batcher.pending}
+            if url.path == '/ready' and method == 'GET':
+                payload = {'ready': self.ready, 'model_loaded': self.model_loaded}
+                if self.load_error:
+                    payload['error'] = f"Model loading failed: {self.load_error}"
+                return (200 if self.ready else 503), payload
+            if url.path == '/metrics' and method == 'GET':
+                return 200, REGISTRY.render()
+            if url.path == '/analyze' and method == 'POST':
+                text = self._json(body)['text']
+                if not isinstance(text, str):
+                    raise ValueError("'text' must be a string")
+                return 200, await self.batcher.submit(text)
+            if url.path == '/analyze/batch' and method == 'POST':
+                texts = self._json(body)['texts']
+                # Checked before anything is queued: a bad item would fail the whole micro-batch it lands in
+                if not isinstance(texts, list) or not all(isinstance(text, str) for text in texts):
+                    raise ValueError("'texts' must be a list of strings")
+                return 200, {'analyses': await self.batcher.submit_many(texts)}
+            if url.path == '/history' and method == 'GET':
+                return 200, await self._history(parse_qs(url.query))
+            if url.path in ('/health', '/ready', '/metrics', '/analyze', '/analyze/batch', '/history'):
+                return 405, {'error': f"{method} not allowed on {url.path}"}
+            return 404, {'error': f"No route for {url.path}"}
+        except Overloaded:
+            return 503, {'error': "Too many pending analyses, retry shortly"}
+        except (KeyError, TypeError, ValueError) as e:
+            return 400, {'error': f"Bad request: {str(e)}"}
+        except Exception as e:
+            return 500, {'error': str(e)}
+
+    @staticmethod
+    def _json(body):
+        payload = json.loads(body or b'{}')
+        if not isinstance(payload, dict):
+            raise ValueError("expected a JSON object")
+        return payload
+
+    async def _history(self, query):
+        def first(name, convert=str):
+            return convert(query[name][0]) if name in query else None
+
+        limit = first('limit', int)
+        if limit is None:
+            limit = 10
+        elif limit < 1:
+            raise ValueError("limit must be at least 1")
+        filters = {
+            'limit': min(limit, MAX_HISTORY_LIMIT),
+            'cursor': first('cursor'),
+            'min_risk': first('min_risk', float),
+            'max_risk': first('max_risk', float),
+            'strength': query.get('strength'),
+            'classification': query.get('classification'),
+            'start_date': first('start_date', _parse_date),
+            'end_date': first('end_date', _parse_date)
+        }
+        df, next_cursor = await asyncio.get_running_loop().run_in_executor(
+            None, lambda: backend_model.get_analyses_page(**filters))
+        return {'items': json.loads(df.to_json(orient='records', date_format='iso')), 'next_cursor': next_cursor}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="SMARTLEXML HTTP analysis service")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--max-batch-size", type=int, default=16)
+    parser.add_argument("--max-wait-ms", type=float, default=10.0)
+    parser.add_argument("--max-pending", type=int, default=1000, help="queued analyses before answering 503")
+    parser.add_argument("--max-body-bytes", type=int, default=10 * 1024 * 1024)
+    parser.add_argument("--no-model", action="store_true", help="rule-based analysis only")
+    parser.add_argument("--chunked", action="store_true", help="let the model read long texts in windows")
+    parser.add_argument("--short-circuit", action="store_true",
+                        help="skip the model for contracts the rules already rate Weak")
+    parser.add_argument("--confidence-margin", type=float,
+                        help="with --chunked, stop at the first window Risky by this softmax margin (0-1)")
+    parser.add_argument("--save", action="store_true", help="save every analysis to legal_contracts.db")
+    args = parser.parse_args(argv)
+
+    service = AnalysisService(use_model=not args.no_model, chunked=args.chunked, save=args.save,
+                              max_batch_size=args.max_batch_size, max_wait_ms=args.max_wait_ms,
+                              max_pending=args.max_pending, max_body_bytes=args.max_body_bytes,
+                              short_circuit=args.short_circuit, confidence_margin=args.confidence_margin)
+
+    async def serve():
+        server = await service.start(args.host, args.port)
+        async with server:
+            await server.serve_forever()
+
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        backend_model.flush_pending_saves()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
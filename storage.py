@@ -0,0 +1,269 @@
+import atexit
+import hashlib
+import os
+import queue
+import sqlite3
+import threading
+import time
+import zlib
+from contextlib import contextmanager
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Applied to every pooled connection: WAL lets readers run alongside one writer,
+# and synchronous=NORMAL only fsyncs at checkpoints, which is safe under WAL
+PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA cache_size=-20000",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA busy_timeout=5000",
+)
+
+# Per-connection cache of prepared statements, reused whenever the same SQL string runs again
+STATEMENT_CACHE_SIZE = 256
+
+
+class ConnectionPool:
+    """Thread-safe pool of long-lived SQLite connections to one database file.
+
+    Connections are opened lazily up to size and handed out one thread at a
+    time. A pool inherited through fork() discards the parent's connections.
+    """
+
+    def __init__(self, db_path, size=4, timeout=30.0):
+        self.db_path = db_path
+        self.size = size
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self._idle = queue.LifoQueue()
+        self._opened = 0
+        self._pid = os.getpid()
+
+    def _open(self):
+        conn = sqlite3.connect(self.db_path, timeout=self.timeout, check_same_thread=False,
+                               cached_statements=STATEMENT_CACHE_SIZE)
+        for pragma in PRAGMAS:
+            conn.execute(pragma)
+        return conn
+
+    def _acquire(self):
+        with self._lock:
+            if self._pid != os.getpid():
+                self._reset()
+            try:
+                return self._idle.get_nowait()
+            except queue.Empty:
+                pass
+            if self._opened < self.size:
+                conn = self._open()
+                self._opened += 1
+                return conn
+        try:
+            return self._idle.get(timeout=self.timeout)
+        except queue.Empty:
+            raise sqlite3.OperationalError(f"No free connection to {self.db_path} after {self.timeout}s")
+
+    @contextmanager
+    def connection(self):
+        """Borrow a connection; the block is one transaction, committed unless it raises"""
+        conn = self._acquire()
+        try:
+            yield conn
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+        finally:
+            self._idle.put(conn)
+
+    def close(self):
+        """Close every idle connection; call once borrowed connections have been returned"""
+        with self._lock:
+            while True:
+                try:
+                    self._idle.get_nowait().close()
+                except queue.Empty:
+                    break
+            self._opened = 0
+
+
+def document_hash(text):
+    """Content address of a document: SHA-256 of its exact text"""
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def compress_text(text):
+    """(codec, blob) for text, using zstd when the zstandard package is installed and zlib otherwise"""
+    data = text.encode('utf-8')
+    if zstandard is not None:
+        return 'zstd', zstandard.ZstdCompressor(level=10).compress(data)
+    return 'zlib', zlib.compress(data, 9)
+
+
+def decompress_text(codec, blob):
+    if codec == 'zstd':
+        if zstandard is None:
+            raise RuntimeError("Document is zstd-compressed but the zstandard package is not installed")
+        return zstandard.ZstdDecompressor().decompress(blob).decode('utf-8')
+    if codec == 'zlib':
+        return zlib.decompress(blob).decode('utf-8')
+    raise ValueError(f"Unknown document codec: {codec}")
+
+
+def store_documents(conn, documents):
+    """Insert {hash: text} into the documents table, compressing only texts not stored yet"""
+    hashes = list(documents)
+    existing = set()
+    for start in range(0, len(hashes), 500):
+        chunk = hashes[start:start + 500]
+        rows = conn.execute(f"SELECT hash FROM documents WHERE hash IN ({', '.join('?' for _ in chunk)})", chunk)
+        existing.update(row[0] for row in rows)
+
+    conn.executemany(
+        "INSERT OR IGNORE INTO documents (hash, codec, body, text_length) VALUES (?, ?, ?, ?)",
+        [(h, *compress_text(documents[h]), len(documents[h])) for h in hashes if h not in existing]
+    )
+
+
+def load_document(conn, doc_hash):
+    """Decompressed text of a stored document, or None"""
+    row = conn.execute("SELECT codec, body FROM documents WHERE hash = ?", (doc_hash,)).fetchone()
+    return decompress_text(*row) if row else None
+
+
+def migrate(conn, migrations):
+    """Bring a database up to date with an ordered list of migrations.
+
+    Each migration is a list of SQL strings or callables taking the
+    connection, applied atomically. PRAGMA user_version counts the migrations
+    already applied, so running this again is a no-op.
+    """
+    while True:
+        conn.execute("BEGIN IMMEDIATE")
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        if version >= len(migrations):
+            conn.commit()
+            return version
+        try:
+            for step in migrations[version]:
+                if callable(step):
+                    step(conn)
+                else:
+                    conn.execute(step)
+            conn.execute(f"PRAGMA user_version = {version + 1}")
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+
+
+_STOP = object()
+
+
+class WriteBehindQueue:
+    """Collects items and writes them from a background thread in batches.
+
+    writer(conn, items) runs inside one transaction per batch. A batch goes out
+    once batch_size items are waiting or flush_interval seconds after its first
+    item arrived. flush() blocks until everything queued so far is written, and
+    close() (also run at interpreter exit) flushes and stops the thread.
+    """
+
+    def __init__(self, pool, writer, batch_size=500, flush_interval=1.0, max_pending=100000):
+        self.pool = pool
+        self.writer = writer
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.failed = 0
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        atexit.register(self.close)
+
+    def _ensure_thread(self):
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+                return
+            self._queue = queue.Queue(maxsize=self.max_pending)
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name="write-behind", daemon=True)
+            self._thread.start()
+
+    def put(self, item):
+        """Queue one item; blocks only when max_pending items are already waiting"""
+        self._ensure_thread()
+        self._queue.put(item)
+
+    def flush(self, timeout=None):
+        """Wait until every item queued before this call has been written"""
+        if self._thread is None or self._pid != os.getpid():
+            return True
+        done = threading.Event()
+        self._queue.put(done)
+        return done.wait(timeout)
+
+    def close(self):
+        with self._lock:
+            thread = self._thread
+            if thread is None or self._pid != os.getpid() or not thread.is_alive():
+                return
+            self._queue.put(_STOP)
+            self._thread = None
+        thread.join()
+
+    def _run(self):
+        batch = []
+        deadline = None
+        while True:
+            timeout = max(0.0, deadline - time.monotonic()) if batch else None
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+
+            if item is _STOP or isinstance(item, threading.Event):
+                self._write(batch)
+                batch = []
+                if item is _STOP:
+                    return
+                item.set()
+                continue
+
+            if item is not None:
+                if not batch:
+                    deadline = time.monotonic() + self.flush_interval
+                batch.append(item)
+            if batch and (len(batch) >= self.batch_size or time.monotonic() >= deadline):
+                self._write(batch)
+                batch = []
+
+    def _write(self, batch):
+        if not batch:
+            return
+        try:
+            with self.pool.connection() as conn:
+                self.writer(conn, batch)
+        except Exception as e:
+            self.failed += len(batch)
+            print(f"Background write of {len(batch)} items failed: {str(e)}")
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(db_path):
+    """The process-wide ConnectionPool for db_path"""
+    key = os.path.abspath(db_path)
+    with _pools_lock:
+        if key not in _pools:
+            _pools[key] = ConnectionPool(key)
+        return _pools[key]
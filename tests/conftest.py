@@ -0,0 +1,50 @@
+"""Shared fixtures: a character-level GPT-2 classifier small enough to run on CPU in milliseconds.
+
+Tests run in a temporary working directory so legal_contracts.db and the
+result cache never touch the checkout.
+"""
+import json
+import os
+import sys
+
+import pytest
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+sys.path.insert(0, os.path.join(REPO_ROOT, 'benchmarks'))
+
+
+@pytest.fixture(scope='session', autouse=True)
+def workdir(tmp_path_factory):
+    path = tmp_path_factory.mktemp('work')
+    previous = os.getcwd()
+    os.chdir(path)
+    yield path
+    os.chdir(previous)
+
+
+@pytest.fixture(scope='session')
+def tiny_model(tmp_path_factory):
+    """(model, tokenizer, device): one token per byte, two layers, a score head scaled up for decisive margins"""
+    torch = pytest.importorskip('torch')
+    transformers = pytest.importorskip('transformers')
+    from transformers.models.gpt2.tokenization_gpt2 import bytes_to_unicode
+
+    import backend_model
+
+    path = tmp_path_factory.mktemp('tokenizer')
+    vocab = {char: i for i, char in enumerate(bytes_to_unicode().values())}
+    vocab['<|endoftext|>'] = len(vocab)
+    (path / 'vocab.json').write_text(json.dumps(vocab))
+    (path / 'merges.txt').write_text('#version: 0.2\n')
+    tokenizer = transformers.GPT2Tokenizer(str(path / 'vocab.json'), str(path / 'merges.txt'))
+    tokenizer.pad_token = tokenizer.eos_token
+
+    torch.manual_seed(0)
+    config = transformers.GPT2Config(vocab_size=len(vocab), n_positions=1024, n_embd=32, n_layer=2, n_head=2,
+                                     num_labels=2)
+    model = transformers.GPT2ForSequenceClassification(config).eval()
+    with torch.no_grad():
+        model.score.weight.mul_(50)
+    backend_model._pad_token_id(model, tokenizer)
+    return model, tokenizer, torch.device('cpu')
@@ -0,0 +1,72 @@
+import random
+
+import pytest
+
+from backend_model import AnalysisSession, analyze_contract
+from synthetic import contract_text
+
+RULE_KEYS = ('risk_score', 'clause_class', 'contract_strength', 'ambiguities', 'fake_indicators', 'modals',
+             'missing_sections', 'references', 'inference_path')
+
+
+def edited_versions(seed, versions=3):
+    rng = random.Random(seed)
+    text = contract_text(rng.choice([1500, 3000, 6000]), seed)
+    for _ in range(versions):
+        yield text
+        at = rng.randrange(len(text))
+        text = text[:at] + rng.choice(['x', ' shall ', ' may', '\n\n3. Termination. ']) + text[at:]
+
+
+def assert_same_verdict(session_analysis, analysis):
+    assert {key: session_analysis[key] for key in RULE_KEYS} == {key: analysis[key] for key in RULE_KEYS}
+    ours, theirs = session_analysis['windows'], analysis['windows']
+    assert (ours['count'], ours['scored']) == (theirs['count'], theirs['scored'])
+    if theirs['risky_window'] is None:
+        assert ours['risky_window'] is None
+    else:
+        # Reused windows were scored in other batches, so margins agree to float precision only
+        assert ours['risky_window']['risky_margin'] == pytest.approx(theirs['risky_window']['risky_margin'],
+                                                                     abs=1e-4)
+        assert ours['risky_window']['index'] == theirs['risky_window']['index']
+
+
+@pytest.mark.parametrize('short_circuit', [False, True])
+def test_session_matches_windowed_analyze_contract(tiny_model, short_circuit):
+    model, tokenizer, device = tiny_model
+    session = AnalysisSession(model, tokenizer, device, short_circuit=short_circuit)
+    windowed = 0
+    for seed in range(20):
+        for text in edited_versions(seed):
+            analysis = analyze_contract(text, model, tokenizer, device, chunked=True, short_circuit=short_circuit)
+            ours = session.analyze(text)
+            if analysis['inference_path'] == 'model':
+                windowed += analysis['windows']['count'] > 1
+                assert_same_verdict(ours, analysis)
+            else:
+                assert {key: ours[key] for key in RULE_KEYS} == {key: analysis[key] for key in RULE_KEYS}
+    assert windowed > 0
+
+
+def test_session_reuses_unchanged_windows(tiny_model):
+    model, tokenizer, device = tiny_model
+    session = AnalysisSession(model, tokenizer, device)
+    text = contract_text(6000, 7)
+    session.analyze(text)
+    # Appending text leaves every full window before the end untouched
+    edited = session.analyze(text + "\n\n40. Notices. The Supplier may send notices by email.")
+    assert edited['incremental']['reused_windows'] > 0
+    assert edited['incremental']['reused'] > 0
+
+
+def test_session_shares_the_result_cache(tiny_model):
+    model, tokenizer, device = tiny_model
+    text = contract_text(3000, 99) + "\n\nSession cache marker."
+    first = AnalysisSession(model, tokenizer, device, short_circuit=True, use_cache=True).analyze(text)
+    assert first['cache'] == 'miss'
+    cached = analyze_contract(text, model, tokenizer, device, chunked=True, use_cache=True, short_circuit=True)
+    assert cached['cache'] in ('memory', 'disk')
+    assert {key: cached[key] for key in RULE_KEYS} == {key: first[key] for key in RULE_KEYS}
+    assert 'incremental' not in cached
+    again = AnalysisSession(model, tokenizer, device, short_circuit=True, use_cache=True).analyze(text)
+    assert again['cache'] in ('memory', 'disk')
@@ -0,0 +1,37 @@
+import json
+
+import batch_analyze
+
+
+def test_bad_jsonl_records_fail_alone(tmp_path, capsys):
+    inputs = tmp_path / 'contracts.jsonl'
+    inputs.write_text("\n".join([
+        json.dumps({'id': 'good-1', 'text': "The Supplier shall deliver the Goods."}),
+        '{"id": "broken", "text": ',
+        json.dumps({'id': 'number', 'text': 5}),
+        json.dumps({'id': 'empty'}),
+        json.dumps(["not", "an", "object"]),
+        json.dumps({'id': 'good-2', 'text': "The Buyer may terminate on notice."}),
+    ]) + "\n")
+    out = tmp_path / 'out.jsonl'
+
+    status = batch_analyze.main([str(inputs), '--workers', '1', '--no-model', '--jsonl-out', str(out)])
+
+    assert status == 1
+    written = [json.loads(line) for line in out.read_text().splitlines()]
+    assert [record['id'] for record in written] == ['good-1', 'good-2']
+    errors = capsys.readouterr().err
+    for line_number in (2, 3, 4, 5):
+        assert f"line {line_number}:" in errors
+    assert json.loads(errors.strip().splitlines()[-1])['failed'] == 4
+
+
+def test_resume_after_bad_records(tmp_path):
+    inputs = tmp_path / 'contracts.jsonl'
+    inputs.write_text(json.dumps({'id': 'ok', 'text': "The Supplier shall deliver."}) + "\n"
+                      + json.dumps({'id': 'bad', 'text': ["list"]}) + "\n")
+    out = tmp_path / 'out.jsonl'
+    args = [str(inputs), '--workers', '1', '--no-model', '--jsonl-out', str(out), '--resume']
+    batch_analyze.main(args)
+    batch_analyze.main(args)
+    assert len(out.read_text().splitlines()) == 1
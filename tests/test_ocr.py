@@ -0,0 +1,37 @@
+import pytest
+from PIL import Image, ImageDraw, ImageOps
+
+pytest.importorskip('pytesseract')
+import ocr  # noqa: E402
+
+
+def test_small_glyph_on_wide_page_keeps_its_band():
+    page = Image.new('L', (2550, 900), 255)
+    ImageDraw.Draw(page).rectangle((1200, 400, 1209, 419), fill=0)
+
+    bands = ocr.split_bands(page)
+
+    assert len(bands) == 1
+    assert ImageOps.invert(bands[0]).getbbox() is not None
+
+
+def test_blank_page_has_no_bands():
+    assert ocr.split_bands(Image.new('L', (2550, 900), 255)) == []
+
+
+def test_single_speck_is_noise():
+    page = Image.new('L', (2550, 900), 255)
+    page.putpixel((100, 100), 0)
+    assert ocr.split_bands(page) == []
+
+
+def test_dpi_is_estimated_on_the_upright_image():
+    # A letter page stored sideways at 100 dpi; EXIF orientation 6 rotates it upright
+    sideways = Image.new('L', (1100, 850), 255)
+    exif = sideways.getexif()
+    exif[0x0112] = 6
+    sideways.info['exif'] = exif.tobytes()
+
+    prepared = ocr.preprocess(sideways)
+
+    assert prepared.size == (2550, 3300)
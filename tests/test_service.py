@@ -0,0 +1,88 @@
+import asyncio
+import json
+
+import pandas as pd
+
+import service
+from service import AnalysisService, MicroBatcher, Overloaded
+
+
+def test_batch_over_capacity_is_refused_before_anything_runs():
+    batches = []
+
+    async def scenario():
+        batcher = MicroBatcher(lambda texts: batches.append(texts) or texts, max_batch_size=4, max_wait_ms=1,
+                               max_pending=3)
+        runner = asyncio.get_running_loop().create_task(batcher.run())
+        try:
+            try:
+                await batcher.submit_many(['a', 'b', 'c', 'd', 'e'])
+            except Overloaded:
+                refused = True
+            else:
+                refused = False
+            await asyncio.sleep(0.01)
+            assert batcher.pending == 0
+            return refused, await batcher.submit_many(['x', 'y', 'z'])
+        finally:
+            runner.cancel()
+
+    refused, results = asyncio.run(scenario())
+    assert refused
+    assert results == ['x', 'y', 'z']
+    assert batches == [['x', 'y', 'z']]
+
+
+def test_batch_route_answers_503_without_analyzing(monkeypatch):
+    saved = []
+    monkeypatch.setattr(service.backend_model, 'save_to_db_async', saved.append)
+
+    async def scenario():
+        app = AnalysisService(use_model=False, save=True, max_pending=3, max_wait_ms=1)
+        runner = asyncio.get_running_loop().create_task(app.batcher.run())
+        try:
+            body = json.dumps({'texts': [f"The Supplier shall deliver {i}." for i in range(5)]}).encode()
+            status, _ = await app._route('POST', '/analyze/batch', body)
+            await asyncio.sleep(0.01)
+            return status
+        finally:
+            runner.cancel()
+
+    assert asyncio.run(scenario()) == 503
+    assert saved == []
+
+
+def test_ready_stays_503_when_the_model_fails_to_load(monkeypatch):
+    def failing_get_model():
+        service.backend_model.MODEL_LOAD_ERROR = "weights file missing"
+        return None, None, None
+
+    monkeypatch.setattr(service.backend_model, 'get_model', failing_get_model)
+
+    async def scenario():
+        app = AnalysisService(use_model=True)
+        await app._load_model()
+        return await app._route('GET', '/ready', b'')
+
+    status, payload = asyncio.run(scenario())
+    assert status == 503
+    assert payload['ready'] is False
+    assert "weights file missing" in payload['error']
+
+
+def test_history_limit(monkeypatch):
+    calls = []
+
+    def fake_page(**filters):
+        calls.append(filters)
+        return pd.DataFrame(), None
+
+    monkeypatch.setattr(service.backend_model, 'get_analyses_page', fake_page)
+
+    async def status(query):
+        return (await AnalysisService(use_model=False)._route('GET', f'/history?{query}', b''))[0]
+
+    assert asyncio.run(status('')) == 200 and calls[-1]['limit'] == 10
+    assert asyncio.run(status('limit=5000')) == 200 and calls[-1]['limit'] == service.MAX_HISTORY_LIMIT
+    assert asyncio.run(status('limit=0')) == 400
+    assert asyncio.run(status('limit=-2')) == 400
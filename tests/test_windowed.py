@@ -0,0 +1,61 @@
+import math
+
+import pytest
+
+from backend_model import analyze_contracts
+from synthetic import contract_text
+
+
+class ForwardCounter:
+    def __init__(self, model):
+        self.calls = 0
+        self._handle = model.register_forward_hook(self._hook)
+
+    def _hook(self, module, inputs, output):
+        self.calls += 1
+
+    def close(self):
+        self._handle.remove()
+
+
+def count_forwards(model, *args, **kwargs):
+    counter = ForwardCounter(model)
+    try:
+        analyses = analyze_contracts(*args, **kwargs)
+    finally:
+        counter.close()
+    return analyses, counter.calls
+
+
+@pytest.mark.parametrize('confidence_margin', [0.0, 0.5, 0.9])
+def test_early_exit_keeps_every_verdict(tiny_model, confidence_margin):
+    model, tokenizer, device = tiny_model
+    texts = [contract_text(size, seed) for seed, size in enumerate([800, 3000, 9000, 20000, 1500, 12000])]
+    full = analyze_contracts(texts, model, tokenizer, device, chunked=True)
+    early = analyze_contracts(texts, model, tokenizer, device, chunked=True, confidence_margin=confidence_margin)
+    for a, b in zip(full, early):
+        assert (a['clause_class'], a['contract_strength'], a['risk_score']) == \
+               (b['clause_class'], b['contract_strength'], b['risk_score'])
+
+
+def test_early_exit_batches_windows_of_a_long_contract(tiny_model):
+    model, tokenizer, device = tiny_model
+    batch_size = 8
+    text = contract_text(40000, 3)
+    (full,), full_calls = count_forwards(model, [text], model, tokenizer, device, batch_size=batch_size,
+                                         chunked=True)
+    windows = full['windows']['count']
+    assert windows > 2 * batch_size
+    assert full_calls == math.ceil(windows / batch_size)
+
+    # A margin no window reaches: every window is scored, in as many passes as without early exit
+    (never,), never_calls = count_forwards(model, [text], model, tokenizer, device, batch_size=batch_size,
+                                           chunked=True, confidence_margin=1.0)
+    assert never['windows']['scored'] == windows
+    assert never_calls == full_calls
+
+    # Any margin: never more passes than scoring everything
+    (early,), early_calls = count_forwards(model, [text], model, tokenizer, device, batch_size=batch_size,
+                                           chunked=True, confidence_margin=0.0)
+    assert early_calls <= full_calls
+    assert early['clause_class'] == full['clause_class']
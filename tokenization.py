@@ -0,0 +1,129 @@
+"""Memoized tokenization and reusable batch tensors for the classifier.
+
+encodings(tokenizer) is the shared EncodingCache of a tokenizer. It keeps
+the full token ids of recently seen texts in an LRU bounded by their size,
+so boilerplate clauses that recur across contracts are run through BPE
+once.
+
+batch_tensors() right-pads id sequences into per-thread input_ids and
+attention_mask buffers that are allocated once and grown as needed.
+"""
+import hashlib
+import threading
+import weakref
+from array import array
+from collections import OrderedDict
+
+from metrics import CACHE_LOOKUPS
+
+
+def _key(text):
+    return hashlib.blake2b(text.encode('utf-8'), digest_size=16).digest()
+
+
+class EncodingCache:
+    """LRU of token ids per text for one tokenizer, bounded by the bytes of ids it holds.
+
+    Ids are stored untruncated as array('i'); encode_many() slices them to
+    max_length, which for GPT-2 (no special tokens added) is exactly what
+    tokenizer(..., truncation=True, max_length=...) returns.
+    """
+
+    def __init__(self, tokenizer, max_bytes=64 * 1024 * 1024):
+        self.tokenizer = tokenizer
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _lookup(self, texts):
+        keys = [_key(text) for text in texts]
+        found = [None] * len(texts)
+        missing = {}
+        with self._lock:
+            for i, key in enumerate(keys):
+                ids = self._entries.get(key)
+                if ids is None:
+                    missing.setdefault(key, []).append(i)
+                else:
+                    self._entries.move_to_end(key)
+                    found[i] = ids
+            hits = len(texts) - sum(len(rows) for rows in missing.values())
+            self.hits += hits
+            self.misses += len(texts) - hits
+        CACHE_LOOKUPS.inc(hits, cache='tokens', outcome='hit')
+        CACHE_LOOKUPS.inc(len(texts) - hits, cache='tokens', outcome='miss')
+
+        if missing:
+            # One batched call for every distinct miss; the fast tokenizer encodes them in parallel
+            rows = list(missing.values())
+            encoded = self.tokenizer([texts[indices[0]] for indices in rows], verbose=False)['input_ids']
+            with self._lock:
+                for key, indices, ids in zip(missing, rows, encoded):
+                    ids = array('i', ids)
+                    for i in indices:
+                        found[i] = ids
+                    if key not in self._entries:
+                        self._entries[key] = ids
+                        self.bytes += len(ids) * ids.itemsize
+                while self.bytes > self.max_bytes and self._entries:
+                    _, evicted = self._entries.popitem(last=False)
+                    self.bytes -= len(evicted) * evicted.itemsize
+        return found
+
+    def encode_many(self, texts, max_length=None):
+        """Token ids (array('i')) per text, the first max_length of them when given"""
+        found = self._lookup(list(texts))
+        if max_length is None:
+            return found
+        return [ids if len(ids) <= max_length else ids[:max_length] for ids in found]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
+
+    def stats(self):
+        return {'entries': len(self._entries), 'bytes': self.bytes, 'hits': self.hits, 'misses': self.misses}
+
+
+_caches = weakref.WeakKeyDictionary()
+_caches_lock = threading.Lock()
+
+
+def encodings(tokenizer):
+    """The EncodingCache shared by every caller of tokenizer; dropped with the tokenizer on a model reload"""
+    with _caches_lock:
+        cache = _caches.get(tokenizer)
+        if cache is None:
+            cache = _caches[tokenizer] = EncodingCache(tokenizer)
+        return cache
+
+
+_buffers = threading.local()
+
+
+def batch_tensors(token_ids, pad_id):
+    """Right-padded (input_ids, attention_mask) for non-empty id sequences, as long tensors.
+
+    The tensors are views of this thread's buffers and are overwritten by its
+    next call, so use them before batching again.
+    """
+    import torch
+
+    rows, width = len(token_ids), max(len(ids) for ids in token_ids)
+    size = rows * width
+    if getattr(_buffers, 'size', 0) < size:
+        _buffers.input_ids = torch.empty(size, dtype=torch.long)
+        _buffers.attention_mask = torch.empty(size, dtype=torch.long)
+        _buffers.size = size
+    input_ids = _buffers.input_ids[:size].view(rows, width).fill_(pad_id)
+    attention_mask = _buffers.attention_mask[:size].view(rows, width).zero_()
+    for row, ids in enumerate(token_ids):
+        if not isinstance(ids, array):
+            ids = array('i', ids)
+        input_ids[row, :len(ids)] = torch.frombuffer(ids, dtype=torch.int32)
+        attention_mask[row, :len(ids)] = 1
+    return input_ids, attention_mask
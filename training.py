@@ -0,0 +1,321 @@
+"""Fine-tune the GPT-2 clause classifier on the full corpus.
+
+    python training.py legal_docs_modified.csv --epochs 3 --batch-size 16 --grad-accum 4 --bf16
+
+Tokenized datasets are cached on disk as memory-mapped arrays, so later runs
+skip tokenization and the corpus never has to fit in RAM. Batches are drawn
+from pools of similar-length samples and padded only to their own longest
+member. Writes gpt2_legal_model.pth and tokenizer.pkl for load_model().
+"""
+import argparse
+import functools
+import hashlib
+import json
+import os
+import pickle
+import shutil
+import sys
+import time
+
+import numpy as np
+
+MAX_LENGTH = 512
+
+
+class TokenCache:
+    """Token ids and labels of a tokenized dataset, memory-mapped from a cache directory.
+
+    Map-style dataset: cache[i] is (token id array, label). The arrays are
+    opened lazily, so DataLoader workers each map the files instead of
+    receiving a pickled copy.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, 'meta.json')) as f:
+            self.meta = json.load(f)
+        self.offsets = np.load(os.path.join(path, 'offsets.npy'))
+        self.lengths = np.diff(self.offsets)
+        self._tokens = None
+        self._labels = None
+
+    def _open(self):
+        if self._labels is None:
+            self._labels = np.load(os.path.join(self.path, 'labels.npy'), mmap_mode='r')
+            if self.offsets[-1]:
+                self._tokens = np.memmap(os.path.join(self.path, 'tokens.bin'), dtype=self.meta['dtype'], mode='r')
+            else:
+                self._tokens = np.empty(0, dtype=self.meta['dtype'])
+
+    def __getstate__(self):
+        return dict(self.__dict__, _tokens=None, _labels=None)
+
+    def __len__(self):
+        return len(self.lengths)
+
+    def __getitem__(self, index):
+        self._open()
+        return self._tokens[self.offsets[index]:self.offsets[index + 1]], int(self._labels[index])
+
+    @classmethod
+    def build(cls, texts, labels, tokenizer, cache_dir, max_length=MAX_LENGTH, chunk_size=10000):
+        """Tokenize texts into cache_dir, or reuse the cache an identical earlier call left there"""
+        texts = list(texts)
+        labels = [int(label) for label in labels]
+        digest = hashlib.sha256(f"{type(tokenizer).__name__}:{len(tokenizer)}:{max_length}".encode())
+        for text, label in zip(texts, labels):
+            digest.update(f"{label}:{len(text)}:".encode())
+            digest.update(text.encode('utf-8', 'surrogatepass'))
+        key = digest.hexdigest()[:32]
+        path = os.path.join(cache_dir, key)
+        if os.path.exists(os.path.join(path, 'meta.json')):
+            return cls(path)
+
+        # Built in a scratch directory and renamed into place, so an interrupted run leaves no half cache
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        os.makedirs(tmp_path, exist_ok=True)
+        dtype = 'uint16' if len(tokenizer) <= np.iinfo(np.uint16).max + 1 else 'int32'
+        offsets = [0]
+        with open(os.path.join(tmp_path, 'tokens.bin'), 'wb') as f:
+            for start in range(0, len(texts), chunk_size):
+                chunk = texts[start:start + chunk_size]
+                for ids in tokenizer(chunk, truncation=True, max_length=max_length)['input_ids']:
+                    f.write(np.asarray(ids, dtype=dtype).tobytes())
+                    offsets.append(offsets[-1] + len(ids))
+        np.save(os.path.join(tmp_path, 'offsets.npy'), np.asarray(offsets, dtype=np.int64))
+        np.save(os.path.join(tmp_path, 'labels.npy'), np.asarray(labels, dtype=np.int64))
+        with open(os.path.join(tmp_path, 'meta.json'), 'w') as f:
+            json.dump({'count': len(texts), 'tokens': offsets[-1], 'dtype': dtype, 'max_length': max_length,
+                       'tokenizer': type(tokenizer).__name__}, f)
+        try:
+            os.replace(tmp_path, path)
+        except OSError:
+            # Another process built the same cache first
+            shutil.rmtree(tmp_path, ignore_errors=True)
+        return cls(path)
+
+
+class LengthBucketSampler:
+    """Batch sampler that groups samples of similar length to keep padding low.
+
+    Each epoch the indices are shuffled and cut into pools of pool_batches
+    batches; each pool is sorted by length and split into batches, and the
+    batch order is shuffled again. With max_tokens a batch also ends before
+    its size times its longest length would exceed max_tokens.
+    """
+
+    def __init__(self, lengths, batch_size=16, max_tokens=None, shuffle=True, pool_batches=50, seed=0):
+        self.lengths = np.asarray(lengths)
+        self.batch_size = batch_size
+        self.max_tokens = max_tokens
+        self.shuffle = shuffle
+        self.pool_batches = pool_batches
+        self.seed = seed
+        self.epoch = 0
+        self._cached = None
+
+    def set_epoch(self, epoch):
+        self.epoch = epoch
+
+    def _batches(self):
+        if self._cached is not None and self._cached[0] == self.epoch:
+            return self._cached[1]
+        rng = np.random.default_rng(self.seed + self.epoch)
+        order = rng.permutation(len(self.lengths)) if self.shuffle else np.arange(len(self.lengths))
+        pool_size = self.batch_size * self.pool_batches if self.shuffle else len(order)
+
+        batches = []
+        for start in range(0, len(order), max(1, pool_size)):
+            pool = order[start:start + pool_size]
+            pool = pool[np.argsort(self.lengths[pool], kind='stable')]
+            batch, longest = [], 0
+            for index in pool.tolist():
+                length = max(1, int(self.lengths[index]))
+                if batch and (len(batch) == self.batch_size
+                              or (self.max_tokens and (len(batch) + 1) * max(longest, length) > self.max_tokens)):
+                    batches.append(batch)
+                    batch, longest = [], 0
+                batch.append(index)
+                longest = max(longest, length)
+            if batch:
+                batches.append(batch)
+        if self.shuffle:
+            batches = [batches[i] for i in rng.permutation(len(batches))]
+        self._cached = (self.epoch, batches)
+        return batches
+
+    def __iter__(self):
+        return iter(self._batches())
+
+    def __len__(self):
+        return len(self._batches())
+
+
+def pad_batch(samples, pad_id):
+    """Right-pad one batch of (ids, label) samples to its longest member"""
+    import torch
+
+    width = max(1, max(len(ids) for ids, _ in samples))
+    input_ids = torch.full((len(samples), width), pad_id, dtype=torch.long)
+    attention_mask = torch.zeros((len(samples), width), dtype=torch.long)
+    for row, (ids, _) in enumerate(samples):
+        if len(ids):
+            input_ids[row, :len(ids)] = torch.from_numpy(np.asarray(ids, dtype=np.int64))
+            attention_mask[row, :len(ids)] = 1
+    labels = torch.tensor([label for _, label in samples], dtype=torch.long)
+    return {'input_ids': input_ids, 'attention_mask': attention_mask, 'labels': labels}
+
+
+def _loader(model, data, sampler, num_workers):
+    from torch.utils.data import DataLoader
+
+    return DataLoader(data, batch_sampler=sampler, num_workers=num_workers,
+                      collate_fn=functools.partial(pad_batch, pad_id=model.config.pad_token_id))
+
+
+def evaluate(model, data, batch_size=32, bf16=False, device=None, num_workers=0):
+    """Accuracy of model on a TokenCache"""
+    import torch
+
+    device = device or next(model.parameters()).device
+    model.eval()
+    correct = total = 0
+    sampler = LengthBucketSampler(data.lengths, batch_size, shuffle=False)
+    with torch.no_grad(), torch.autocast(device_type=device.type, dtype=torch.bfloat16, enabled=bf16):
+        for batch in _loader(model, data, sampler, num_workers):
+            logits = model(input_ids=batch['input_ids'].to(device),
+                           attention_mask=batch['attention_mask'].to(device)).logits
+            correct += (logits.argmax(dim=1).cpu() == batch['labels']).sum().item()
+            total += len(batch['labels'])
+    return correct / total if total else 0.0
+
+
+def train(model, train_data, eval_data=None, epochs=3, batch_size=16, max_tokens=None, grad_accum_steps=1,
+          lr=5e-5, max_grad_norm=1.0, bf16=False, device=None, num_workers=0, seed=42, log_every=100):
+    """Fine-tune model on a TokenCache; returns one {'epoch', 'loss', 'tokens_per_s', ...} dict per epoch.
+
+    The optimizer steps once every grad_accum_steps batches, so the effective
+    batch is batch_size * grad_accum_steps. bf16 runs the forward pass under
+    bfloat16 autocast (CPU or GPU) while the weights and optimizer stay fp32.
+    """
+    import torch
+    from torch.optim import AdamW
+
+    device = device or next(model.parameters()).device
+    if model.config.pad_token_id is None:
+        model.config.pad_token_id = model.config.eos_token_id
+    sampler = LengthBucketSampler(train_data.lengths, batch_size, max_tokens, shuffle=True, seed=seed)
+    loader = _loader(model, train_data, sampler, num_workers)
+    optimizer = AdamW(model.parameters(), lr=lr)
+    criterion = torch.nn.CrossEntropyLoss()
+
+    history = []
+    for epoch in range(epochs):
+        sampler.set_epoch(epoch)
+        model.train()
+        optimizer.zero_grad(set_to_none=True)
+        total_loss, tokens, started = 0.0, 0, time.perf_counter()
+        steps = len(sampler)
+
+        for step, batch in enumerate(loader, start=1):
+            labels = batch['labels'].to(device)
+            with torch.autocast(device_type=device.type, dtype=torch.bfloat16, enabled=bf16):
+                logits = model(input_ids=batch['input_ids'].to(device),
+                               attention_mask=batch['attention_mask'].to(device)).logits
+            loss = criterion(logits.float(), labels)
+            (loss / grad_accum_steps).backward()
+
+            if step % grad_accum_steps == 0 or step == steps:
+                if max_grad_norm:
+                    torch.nn.utils.clip_grad_norm_(model.parameters(), max_grad_norm)
+                optimizer.step()
+                optimizer.zero_grad(set_to_none=True)
+
+            total_loss += loss.item()
+            tokens += int(batch['attention_mask'].sum())
+            if log_every and step % log_every == 0:
+                print(f"Epoch {epoch + 1}/{epochs} step {step}/{steps} - loss {total_loss / step:.4f}")
+
+        elapsed = time.perf_counter() - started
+        result = {'epoch': epoch + 1, 'loss': total_loss / max(1, steps), 'tokens_per_s': tokens / elapsed}
+        if eval_data is not None:
+            result['accuracy'] = evaluate(model, eval_data, batch_size * 2, bf16, device, num_workers)
+        print(f"Epoch {epoch + 1} - " + ", ".join(f"{k}: {v:.4f}" for k, v in result.items() if k != 'epoch'))
+        history.append(result)
+    return history
+
+
+def train_from_csv(csv_path, text_column='clause_text', label_column='clause_status', cache_dir='token_cache',
+                   test_size=0.2, sample=None, seed=42, max_length=MAX_LENGTH, weights_out='gpt2_legal_model.pth',
+                   tokenizer_out='tokenizer.pkl', **train_options):
+    """Load a labelled CSV, cache its tokens, fine-tune GPT-2 and save the weights and tokenizer.
+
+    Returns (model, history). train_options go to train().
+    """
+    import pandas as pd
+    import torch
+    from transformers import AutoTokenizer, GPT2ForSequenceClassification
+
+    df = pd.read_csv(csv_path).dropna(subset=[label_column])
+    if sample:
+        df = df.sample(sample, random_state=seed)
+    texts = df[text_column].fillna("").astype(str).tolist()
+    labels = df[label_column].astype(int).tolist()
+
+    order = np.random.default_rng(seed).permutation(len(texts))
+    split = int(len(texts) * (1 - test_size))
+    train_idx, test_idx = order[:split], order[split:]
+
+    tokenizer = AutoTokenizer.from_pretrained("gpt2")
+    tokenizer.pad_token = tokenizer.eos_token
+    started = time.perf_counter()
+    train_data = TokenCache.build([texts[i] for i in train_idx], [labels[i] for i in train_idx], tokenizer,
+                                  cache_dir, max_length)
+    test_data = TokenCache.build([texts[i] for i in test_idx], [labels[i] for i in test_idx], tokenizer,
+                                 cache_dir, max_length) if len(test_idx) else None
+    print(f"Token cache ready in {time.perf_counter() - started:.1f}s: {len(train_data)} train / "
+          f"{len(test_data) if test_data else 0} test samples")
+
+    device = train_options.pop('device', None) or torch.device("cuda" if torch.cuda.is_available() else "cpu")
+    model = GPT2ForSequenceClassification.from_pretrained("gpt2", num_labels=2)
+    model.config.pad_token_id = model.config.eos_token_id
+    model.to(device)
+
+    history = train(model, train_data, test_data, device=device, **train_options)
+
+    torch.save(model.state_dict(), weights_out)
+    with open(tokenizer_out, 'wb') as f:
+        pickle.dump(tokenizer, f)
+    return model, history
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Fine-tune the GPT-2 clause classifier")
+    parser.add_argument("csv", help="labelled clauses, e.g. legal_docs_modified.csv")
+    parser.add_argument("--text-column", default="clause_text")
+    parser.add_argument("--label-column", default="clause_status")
+    parser.add_argument("--cache-dir", default="token_cache", help="where tokenized datasets are kept")
+    parser.add_argument("--sample", type=int, help="train on a random sample of this many rows")
+    parser.add_argument("--test-size", type=float, default=0.2)
+    parser.add_argument("--epochs", type=int, default=3)
+    parser.add_argument("--batch-size", type=int, default=16)
+    parser.add_argument("--max-tokens", type=int, help="also cap each batch at this many padded tokens")
+    parser.add_argument("--grad-accum", type=int, default=1, help="batches per optimizer step")
+    parser.add_argument("--lr", type=float, default=5e-5)
+    parser.add_argument("--bf16", action="store_true", help="bfloat16 autocast for the forward pass")
+    parser.add_argument("--workers", type=int, default=0, help="DataLoader worker processes")
+    parser.add_argument("--weights-out", default="gpt2_legal_model.pth")
+    parser.add_argument("--tokenizer-out", default="tokenizer.pkl")
+    args = parser.parse_args(argv)
+
+    _, history = train_from_csv(args.csv, args.text_column, args.label_column, args.cache_dir, args.test_size,
+                                args.sample, weights_out=args.weights_out, tokenizer_out=args.tokenizer_out,
+                                epochs=args.epochs, batch_size=args.batch_size, max_tokens=args.max_tokens,
+                                grad_accum_steps=args.grad_accum, lr=args.lr, bf16=args.bf16,
+                                num_workers=args.workers)
+    print(json.dumps(history, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())